@@ -1,38 +1,81 @@
-from flask import Flask, render_template, request, send_from_directory, send_file, redirect, url_for, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, jsonify, session, Response, stream_with_context, g
 from authlib.integrations.flask_client import OAuth 
 import os
 import secrets
-import boto3
+import time
 import json  
 from datetime import datetime  
 import shutil 
-import pandas as pd
 from io import BytesIO
 from werkzeug.utils import secure_filename
-from modules.models import process_pptx
-from modules.model2 import main as generate_audio_story
-from modules.ganttchart import generate_gantt_chart
-import matplotlib
-matplotlib.use('Agg')  
-import matplotlib.pyplot as plt
-from modules.utils import process_document
-from modules.flowchart import process_user_input
-boto3.setup_default_session(region_name=os.getenv('AWS_REGION', 'ap-south-1'))
-
-app = Flask(__name__)
+# the tool modules (pandas, matplotlib, boto3, pdf2image, graphviz...) are
+# imported inside the views that use them, so starting a worker stays cheap
+from modules.session_store import SqliteSessionInterface
+from modules.workspace import workspace, unique_name
+from modules.bedrock_stream import (start_stream_job, get_stream, sse_events, acquire_follower_slot,
+                                    release_follower_slot)
+from modules.result_cache import cache_key, load_cached, store_cached, update_cached, drop_cached, evict_outputs
+from modules.delivery import send_artifact, send_from_folder
+from modules.uploads import UploadRequest, read_uploads, stored_upload, claim_upload, discard_unclaimed_uploads
+from modules.metrics import observe, render_metrics
+from modules.history_store import LEGACY_OWNER
+# region for every boto3 client, picked up when the first one is created
+os.environ.setdefault('AWS_DEFAULT_REGION', os.getenv('AWS_REGION', 'ap-south-1'))
+
+# /static is served by static_file() below (strong ETags, X-Accel-Redirect)
+app = Flask(__name__, static_folder=None)
+# uploads are streamed to disk and hashed while the body is parsed (modules/uploads.py);
+# every early return, error and finished job leaves nothing behind in UPLOAD_FOLDER
+app.request_class = UploadRequest
+app.teardown_request(discard_unclaimed_uploads)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['AUDIO_FOLDER'] = 'static/audio'
 app.config['OUTPUT_FOLDER'] = 'static/output'
 app.config['EXCEL_OUTPUT_FOLDER'] = 'static/output/excels'
+# summarizer/translator results offered as /download/<name>
+app.config['DOCUMENT_OUTPUT_FOLDER'] = 'static/output/documents'
 app.config['GANTT_IMAGE_FOLDER'] = 'static/output/images'
+app.config['GANTT_PREVIEW_FORMAT'] = os.getenv('GANTT_PREVIEW_FORMAT', 'png')  # png or svg
+app.config['GANTT_CACHE_FOLDER'] = 'cache/gantt'
+# generated files and cache records are evicted by age and total size: Gantt
+# outputs and results, document results, narrations, flowchart renders
+# (RENDER_DIR in modules/flowchart.py) and the flowchart prompt cache (PROMPT_CACHE_DIR)
+app.config['EVICTED_FOLDERS'] = ['static/output', 'static/audio', 'cache/gantt', 'static/renders',
+                                 'cache/flowchart_prompts']
+app.config['OUTPUT_MAX_BYTES'] = int(os.getenv('OUTPUT_MAX_MB', '2048')) * 1024 * 1024
+app.config['OUTPUT_MAX_AGE_SECONDS'] = int(os.getenv('OUTPUT_MAX_AGE_HOURS', '168')) * 3600
+app.config['OUTPUT_EVICT_INTERVAL_SECONDS'] = 300
+# behind nginx: answer file requests with headers only and let nginx send the
+# bytes via X-Accel-Redirect (needs the internal /protected/ location)
+app.config['X_ACCEL_REDIRECT'] = os.getenv('X_ACCEL_REDIRECT', '0') == '1'
+
+# request size limit for everything that isn't a file upload (forms, JSON)
+app.config['MAX_CONTENT_LENGTH'] = 4 * 1024 * 1024
+# per-endpoint upload limits and accepted extensions; a larger Content-Length
+# or an unsupported file name is rejected before the file data is read
+DOCUMENT_EXTENSIONS = (".pdf", ".doc", ".docx", ".dot", ".dotx", ".docm", ".dotm", ".xml", ".rtf", ".txt")
+app.config['UPLOAD_RULES'] = {
+    'upload_ppt_to_mp3': {'max_bytes': int(os.getenv('PPT_UPLOAD_MAX_MB', '100')) * 1024 * 1024,
+                          'extensions': (".ppt", ".pptx")},
+    'process': {'max_bytes': int(os.getenv('DOCUMENT_UPLOAD_MAX_MB', '50')) * 1024 * 1024,
+                'extensions': DOCUMENT_EXTENSIONS},
+    'gantt_chart': {'max_bytes': int(os.getenv('GANTT_UPLOAD_MAX_MB', '20')) * 1024 * 1024,
+                    'extensions': (".xlsx", ".xls", ".csv", ".txt")},  # schedule + holiday list
+}
+app.config['UPLOAD_RULES']['process_stream'] = app.config['UPLOAD_RULES']['process']
 
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 os.makedirs(app.config['EXCEL_OUTPUT_FOLDER'], exist_ok=True)
+os.makedirs(app.config['DOCUMENT_OUTPUT_FOLDER'], exist_ok=True)
 os.makedirs(app.config['GANTT_IMAGE_FOLDER'], exist_ok=True)
+os.makedirs(app.config['GANTT_CACHE_FOLDER'], exist_ok=True)
 
 FLOWCHART_DIR = "flowcharts"
+# client-side mode: pages get the graph as DOT and draw it in the browser;
+# dot only runs on the server for exports
+app.config['FLOWCHART_CLIENT_RENDER'] = os.getenv('FLOWCHART_CLIENT_RENDER', '0') == '1'
 # #login page
 # @app.route('/')
 # def login():
@@ -44,7 +87,13 @@ FLOWCHART_DIR = "flowcharts"
 # def home():
 
 #     return render_template('index.html')
-app.secret_key = os.urandom(24)
+# must be identical in every worker process and on every node
+app.secret_key = os.getenv('FLASK_SECRET_KEY')
+if not app.secret_key:
+    print("FLASK_SECRET_KEY is not set; using a random key (only safe for a single dev process)")
+    app.secret_key = os.urandom(24)
+# session data lives in SQLite; the cookie only holds an opaque session id
+app.session_interface = SqliteSessionInterface()
 
 # Initialize OAuth
 oauth = OAuth(app)
@@ -68,6 +117,50 @@ microsoft = oauth.register(
     client_kwargs={'scope': 'openid email profile User.Read'},
 )
 
+SESSION_USER_CLAIMS = ("name", "preferred_username", "email", "oid")
+
+# request latency per endpoint (for streamed responses: time until the body starts)
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        observe("http_request_duration_seconds", time.perf_counter() - started,
+                endpoint=request.endpoint or "unmatched", method=request.method, status=response.status_code)
+    return response
+
+# generated files only appear after POSTs; evict_outputs itself runs at most
+# once per OUTPUT_EVICT_INTERVAL_SECONDS
+@app.after_request
+def evict_generated_files(response):
+    if request.method == 'POST':
+        evict_outputs(app.config['EVICTED_FOLDERS'],
+                      app.config['OUTPUT_MAX_BYTES'], app.config['OUTPUT_MAX_AGE_SECONDS'],
+                      min_interval_seconds=app.config['OUTPUT_EVICT_INTERVAL_SECONDS'])
+    return response
+
+# Prometheus scrape target, for scrapers on the instance itself. nginx also
+# connects from 127.0.0.1, but it sets X-Real-IP/X-Forwarded-For, so proxied
+# requests are refused even if the nginx location is missing. With
+# METRICS_TOKEN set, a matching bearer token is required instead.
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+
+def metrics_allowed():
+    token = app.config['METRICS_TOKEN']
+    if token:
+        return secrets.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    proxied = 'X-Real-IP' in request.headers or 'X-Forwarded-For' in request.headers
+    return request.remote_addr in ('127.0.0.1', '::1') and not proxied
+
+@app.route('/metrics')
+def metrics():
+    if not metrics_allowed():
+        return Response("Not Found", status=404, mimetype="text/plain")
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 # Root route — also serves as login callback
 @app.route('/')
 def login():
@@ -80,7 +173,9 @@ def login():
         user_info = microsoft.parse_id_token(token, nonce=nonce)
 
         if user_info:
-            session['user'] = user_info
+            # fresh session id at login; keep only the claims the app uses
+            session.regenerate()
+            session['user'] = {k: user_info[k] for k in SESSION_USER_CLAIMS if k in user_info}
             print("User logged in:", user_info)
             return redirect(url_for('home'))
         return "Authorization failed", 400
@@ -124,37 +219,39 @@ def logout():
 @app.route('/ppt-to-mp3', methods=['GET'])
 def ppt_to_mp3():
     audio_file = session.pop('audio_file', None)
-    return render_template('ppt-to-mp3.html', audio_file=audio_file)
+    return render_template('ppt-to-mp3.html', audio_file=audio_file, error=session.pop('ppt_error', None))
 
 @app.route('/upload', methods=['POST'])
 def upload_ppt_to_mp3():
+    from modules.models import process_pptx
 
-    if 'ppt_file' not in request.files:
+    files, error = read_uploads()
+    if error:
+        session['ppt_error'] = error
         return redirect(url_for('ppt_to_mp3'))
 
-    file = request.files['ppt_file']
-    if file.filename == '':
+    upload = stored_upload(files.get('ppt_file'))
+    if upload is None:
         return redirect(url_for('ppt_to_mp3'))
 
-    filename = secure_filename(file.filename)
-    ppt_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(ppt_path)
-
-    base_name = os.path.splitext(filename)[0]
-    txt_output_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{base_name}_output.txt")
-    images_output_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"{base_name}_images")
+    base_name = os.path.splitext(secure_filename(files['ppt_file'].filename))[0]
+    # every upload narrates straight into its own audio file
+    audio_filename = unique_name(f"{base_name}_audio", ".mp3")
+    final_audio_path = os.path.join(app.config['AUDIO_FOLDER'], audio_filename)
 
-    # ---- PROCESS STARTS ----
-    process_pptx(ppt_path, txt_output_path, images_output_dir)
-    generate_audio_story(txt_output_path, pause_ms=1500)
+    # slide text and images live in a per-job directory, removed afterwards
+    # together with the uploaded deck
+    with workspace("ppt") as workdir:
+        txt_output_path = os.path.join(workdir, f"{base_name}_output.txt")
+        images_output_dir = os.path.join(workdir, f"{base_name}_images")
 
-    audio_filename = f"{base_name}_audio.mp3"
-    temp_audio_path = os.path.join('static', 'audio', 'story_audio.mp3')
-    final_audio_path = os.path.join(app.config['AUDIO_FOLDER'], audio_filename)
+        # ---- PROCESS STARTS ----
+        try:
+            process_pptx(upload.path, txt_output_path, images_output_dir, audio_output=final_audio_path)
+        finally:
+            upload.discard()
 
-    if os.path.exists(temp_audio_path):
-        shutil.move(temp_audio_path, final_audio_path)
-    else:
+    if not os.path.exists(final_audio_path):
         session['audio_file'] = None
         return redirect(url_for('ppt_to_mp3'))
 
@@ -164,32 +261,20 @@ def upload_ppt_to_mp3():
 
 
 # Document Processor
-@app.route('/doc-summarizer', methods=['GET', 'POST'])
-def doc_summarizer():
-    if request.method == 'POST':
-        pass
-    return render_template('doc-summarizer.html')
-
-
 @app.route('/process', methods=['POST'])
 def process():
+    from modules.utils import process_document
 
-    file = request.files['document']
-    operation = request.form['operation']
-    skip_pages_raw = request.form.get('skip_pages', '').strip()
-
-    filename = secure_filename(file.filename)
-    ext = os.path.splitext(filename)[1].lower()
-
-    word_extensions = [".doc",".docx",".dot",".dotx",".docm",".dotm",".xml",".rtf",".txt"]
-
-    # Validate
-    if ext not in [".pdf"] + word_extensions:
-        session['doc_error'] = "Unsupported file format"
+    # type and size are validated while the body is parsed
+    files, error = read_uploads()
+    upload = stored_upload(files.get('document')) if files else None
+    if error or upload is None:
+        session['doc_error'] = error or "Unsupported file format"
         return redirect(url_for('doc_summarizer'))
 
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    filepath = upload.path
+    operation = request.form['operation']
+    skip_pages_raw = request.form.get('skip_pages', '').strip()
 
     if skip_pages_raw:
         pages_to_skip = [int(x.strip()) for x in skip_pages_raw.split(',') if x.strip().isdigit()]
@@ -206,8 +291,8 @@ def process():
         session['doc_error'] = str(e)
         return redirect(url_for('doc_summarizer'))
 
-    output_filename = "processed_output.txt"
-    output_filepath = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
+    output_filename = unique_name("processed_output", ".txt")
+    output_filepath = os.path.join(app.config['DOCUMENT_OUTPUT_FOLDER'], output_filename)
     with open(output_filepath, "w", encoding="utf-8") as f:
         f.write(result_text)
 
@@ -217,6 +302,50 @@ def process():
     return redirect(url_for('doc_summarizer'))
 
 
+# streaming variant used by the page's script: returns a stream id at once,
+# the text then arrives token by token on /stream/<id>
+@app.route('/process-stream', methods=['POST'])
+def process_stream():
+    files, error = read_uploads()
+    upload = stored_upload(files.get('document')) if files else None
+    if error or upload is None:
+        return jsonify({"error": error or "Unsupported file format"}), 400
+
+    operation = request.form['operation']
+    skip_pages_raw = request.form.get('skip_pages', '').strip()
+
+    pages_to_skip = [int(x.strip()) for x in skip_pages_raw.split(',') if x.strip().isdigit()]
+    # the job outlives the request: it removes the document itself
+    stream_id = start_stream_job(run_document_job, claim_upload(upload), operation, pages_to_skip)
+    return jsonify({"stream": stream_id})
+
+def run_document_job(stream, upload, operation, pages_to_skip):
+    from modules.utils import process_document
+
+    try:
+        result_text = process_document(input_path=upload.path, operation=operation,
+                                       pages_to_skip=pages_to_skip, stream=stream)
+    finally:
+        upload.discard()
+    output_filename = unique_name("processed_output", ".txt")
+    with open(os.path.join(app.config['DOCUMENT_OUTPUT_FOLDER'], output_filename), "w", encoding="utf-8") as f:
+        f.write(result_text)
+    return {"download": f"/download/{output_filename}"}
+
+# server-sent events for any background model stream (doc results, gantt summaries, flowchart progress)
+@app.route('/stream/<stream_id>')
+def stream_events(stream_id):
+    stream = get_stream(stream_id)
+    if stream is None:
+        return jsonify({"status": "unknown"}), 404
+    # each follower holds a worker thread: bounded by STREAM_MAX_FOLLOWERS
+    if not acquire_follower_slot():
+        return jsonify({"status": "busy"}), 503
+    response = Response(stream_with_context(sse_events(stream)), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(release_follower_slot)
+    return response
+
 @app.route('/doc-summarizer', methods=['GET'])
 def doc_summarizer():
     result = session.pop('doc_result', None)
@@ -233,13 +362,27 @@ def doc_summarizer():
 
 @app.route('/download/<filename>', endpoint='download_file')
 def download_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
+    return send_from_folder(app.config['DOCUMENT_OUTPUT_FOLDER'], filename, as_attachment=True,
+                            accel=app.config['X_ACCEL_REDIRECT'])
+
+# generated audio, Excel files and images live under static/; Range requests let
+# the audio player seek without downloading the narration again
+@app.route('/static/<path:filename>', endpoint='static')
+def static_file(filename):
+    return send_from_folder(os.path.join(app.root_path, 'static'), filename,
+                            accel=app.config['X_ACCEL_REDIRECT'])
 
 # Gantt chart Generation
 @app.route('/gantt-chart', methods=['GET', 'POST'])
 def gantt_chart():
+    from modules.ganttchart import (generate_gantt_chart, render_gantt_preview, on_summary, load_holidays,
+                                    GANTT_GENERATOR_VERSION)
+
     if request.method == 'POST':
-        file = request.files.get('file')
+        files, error = read_uploads()
+        if error:
+            return render_template('gantt-chart.html', error=error)
+        file = files.get('file')
         if not file:
             return render_template('gantt-chart.html', error="No file uploaded")
 
@@ -247,112 +390,190 @@ def gantt_chart():
         include_sunday = request.form.get('include_sunday', 'yes').lower() == 'yes'
 
         filename = secure_filename(file.filename)
-        if filename == "":
+        upload = stored_upload(file)
+        if upload is None:
             return render_template('gantt-chart.html', error="Invalid filename")
 
-        # save uploaded file
+        # already on disk under a unique name, hashed while it was received
+        upload_path = upload.path
         unique = secrets.token_hex(8)
-        upload_name = f"{unique}_{filename}"
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], upload_name)
-        file.save(upload_path)
+
+        # optional holiday list (excluded from working-day durations and the grid)
+        holidays = None
+        holiday_upload = stored_upload(files.get('holidays'))
+        if holiday_upload:
+            try:
+                holidays = load_holidays(holiday_upload.path)
+            except Exception as e:
+                return render_template('gantt-chart.html', error=f"Could not read holiday list: {e}")
+            finally:
+                # the dates are in memory now (and part of the cache key)
+                holiday_upload.discard()
+
+        sheet_name = request.form.get('sheet_name', '').strip() or None
+        granularity = request.form.get('granularity', 'auto').lower()
+        preview_format = request.form.get('preview_format', app.config['GANTT_PREVIEW_FORMAT']).lower()
+
+        # same file + same options as an earlier request: reuse its outputs
+        cache_folder = app.config['GANTT_CACHE_FOLDER']
+        key = cache_key(upload.sha256, include_saturday, include_sunday,
+                        None if holidays is None else [str(h) for h in holidays],
+                        sheet_name, granularity, preview_format, GANTT_GENERATOR_VERSION)
+        cached = load_cached(cache_folder, key)
+        if cached and (cached.get("ai_summary") or summary_pending(cached.get("summary_job"))):
+            upload.discard()
+            return gantt_result_page(cached)
+
+        # write the excel straight into static output for download
+        excel_name = f"{unique}_{os.path.splitext(filename)[0]}_gantt_output.xlsx"
+        excel_dest = os.path.join(app.config['EXCEL_OUTPUT_FOLDER'], excel_name)
 
         try:
             # generate gantt excel using module
             output_excel, meta = generate_gantt_chart(
                 upload_path,
                 include_saturday=include_saturday,
-                include_sunday=include_sunday
+                include_sunday=include_sunday,
+                output_excel=excel_dest,
+                holidays=holidays,
+                sheet_name=sheet_name,
+                granularity=granularity
             )
         except Exception as e:
             # show error on page
             return render_template('gantt-chart.html', error=str(e))
 
-        # copy/move excel into static output for download
-        excel_basename = os.path.basename(output_excel)
-        excel_dest = os.path.join(app.config['EXCEL_OUTPUT_FOLDER'], f"{unique}_{excel_basename}")
-        shutil.copy(output_excel, excel_dest)
+        # typed task list from the generator (Start/End already datetime)
+        df = meta["schedule"]
 
-        # read task list to create image
-        try:
-            df = pd.read_excel(output_excel, sheet_name='Task List', engine='openpyxl')
-        except Exception as e:
-            return render_template('gantt-chart.html', error=f"Failed reading generated excel: {e}")
-
-        # ensure Start Date and End Date are datetime
-        if not pd.api.types.is_datetime64_any_dtype(df['Start Date']):
-            df['Start Date'] = pd.to_datetime(df['Start Date'], errors='coerce')
-        if not pd.api.types.is_datetime64_any_dtype(df['End Date']):
-            df['End Date'] = pd.to_datetime(df['End Date'], errors='coerce')
-
-        # build plot
-        plt.figure(figsize=(12, max(4, 0.4 * len(df))))  # height scales with number of tasks
-        # convert dates to matplotlib date numbers is optional; matplotlib handles datetimes
-        y_positions = range(len(df))
-        # use reversed order so first task appears at top
-        for i, (idx, row) in enumerate(df.iloc[::-1].iterrows()):
-            task_name = row['Task']
-            start = row['Start Date']
-            end = row['End Date']
-            if pd.isna(start) or pd.isna(end):
-                continue
-            duration = (end - start).days + 1
-            plt.barh(i, duration, left=start, height=0.6)
-
-        plt.yticks(range(len(df)), df['Task'].iloc[::-1])
-        plt.xlabel('Date')
-        plt.title('Gantt Chart Preview')
-        plt.tight_layout()
-
-        img_name = f"gantt_{unique}.png"
-        img_path = os.path.join(app.config['GANTT_IMAGE_FOLDER'], img_name)
-        plt.savefig(img_path, bbox_inches='tight')
-        plt.close()
+        # render preview pages (overview + paginated detail for large plans)
+        img_files = render_gantt_preview(df, app.config['GANTT_IMAGE_FOLDER'], f"gantt_{unique}", fmt=preview_format)
 
         # prepare URLs for template (these are relative to static folder)
-        excel_rel = f"output/excels/{os.path.basename(excel_dest)}"
-        img_rel = f"output/images/{img_name}"
-
-        return render_template('gantt-chart.html',
-                               gantt_image=img_rel,
-                               download_excel=excel_rel,
-                               ai_summary=meta.get("ai_summary", ""),
-                               open_tasks=meta.get("open_tasks", []),
-                               project_start=meta.get("project_start"),
-                               project_end=meta.get("project_end")
-                               )
+        record = {
+            "excel": f"output/excels/{os.path.basename(excel_dest)}",
+            "images": [f"output/images/{name}" for name in img_files],
+            "files": [excel_dest] + [os.path.join(app.config['GANTT_IMAGE_FOLDER'], name) for name in img_files],
+            "ai_summary": meta.get("ai_summary", ""),
+            "summary_job": meta.get("summary_job"),
+            "open_tasks": meta.get("open_tasks", []),
+            "project_start": str(meta.get("project_start")),
+            "project_end": str(meta.get("project_end")),
+        }
+        store_cached(cache_folder, key, record)
+        if not record["ai_summary"]:
+            on_summary(record["summary_job"], lambda text: remember_gantt_summary(key, text))
+
+        return gantt_result_page(record)
 
     return render_template('gantt-chart.html')
 
+def gantt_result_page(record):
+    return render_template('gantt-chart.html',
+                           gantt_image=record["images"][0],
+                           gantt_pages=record["images"][1:],
+                           download_excel=record["excel"],
+                           ai_summary=record.get("ai_summary", ""),
+                           summary_job=record.get("summary_job"),
+                           open_tasks=record.get("open_tasks", []),
+                           project_start=record.get("project_start"),
+                           project_end=record.get("project_end")
+                           )
+
+def summary_pending(job_id):
+    from modules.ganttchart import get_summary
+
+    # a cached result without summary is only usable while its job is still known
+    try:
+        get_summary(job_id, timeout=0)
+        return True
+    except KeyError:
+        return False
+
+def remember_gantt_summary(key, text):
+    from modules.ganttchart import SUMMARY_FAILED_PREFIX
+
+    # failed summaries are not cached: the next identical upload regenerates
+    if text.startswith(SUMMARY_FAILED_PREFIX):
+        drop_cached(app.config['GANTT_CACHE_FOLDER'], key)
+    else:
+        update_cached(app.config['GANTT_CACHE_FOLDER'], key, ai_summary=text)
+
+# polled by the gantt page until the background AI summary is ready
+@app.route('/gantt-summary/<job_id>')
+def gantt_summary(job_id):
+    from modules.ganttchart import get_summary
+
+    try:
+        summary = get_summary(job_id, timeout=0)
+    except KeyError:
+        return jsonify({"status": "unknown"}), 404
+    if summary is None:
+        return jsonify({"status": "pending"})
+    return jsonify({"status": "done", "summary": summary})
+
 # Flow chart Generation
-@app.route('/flow-chart', methods=['GET', 'POST'])
-def flow_chart():
+def history_owner():
+    # flowchart history is scoped to the signed-in user ("" when not signed in)
+    user = session.get("user") or {}
+    return user.get("preferred_username", user.get("email", ""))
+
+def history_owners():
+    # what the visitor may open and edit: their own sessions and, once signed
+    # in, the ones imported from the old shared chat_history.json
+    owner = history_owner()
+    return (owner, LEGACY_OWNER) if owner else (owner,)
+
+def history_page():
     from modules.flowchart import load_history
-    return render_template("flow-chart.html", history=load_history(), prompt_value="")
+    return load_history(history_owners(), before=request.args.get("before", type=int))
 
 @app.route("/generate", methods=["POST"])
 def generate():
-    from modules.flowchart import process_user_input, load_history
+    from modules.flowchart import process_user_input
 
     user_query = request.form["process_text"]
-    image_path, _, error = process_user_input(user_query)
+    client_render = app.config['FLOWCHART_CLIENT_RENDER']
+    image_path, entry, error = process_user_input(user_query, history_owner(), request.form.get("format"),
+                                                  render=not client_render)
 
     if error:
         session['flow_error'] = error
         return redirect("/flow-chart")
 
-    session['flow_image'] = f"/download-image/{os.path.basename(image_path)}"
+    if client_render:
+        return redirect(f"/session/{entry['id']}")
+
+    session['flow_image'] = "/" + image_path
     session['flow_query'] = user_query
 
     return redirect("/flow-chart")
 
 
+@app.route("/generate-stream", methods=["POST"])
+def generate_stream():
+    # same as /generate, but reports node/edge counts while the model answers
+    stream_id = start_stream_job(run_flowchart_job, request.form["process_text"], history_owner(),
+                                 request.form.get("format"), not app.config['FLOWCHART_CLIENT_RENDER'])
+    return jsonify({"stream": stream_id})
+
+def run_flowchart_job(stream, user_query, owner, fmt, render):
+    from modules.flowchart import process_user_input
+
+    _, entry, error = process_user_input(user_query, owner, fmt, render=render, stream=stream)
+    if error:
+        raise Exception(error)
+    return {"session_url": f"/session/{entry['id']}"}
+
+
 @app.route('/flow-chart')
 def flow_chart():
-    from modules.flowchart import load_history
+    history, next_page = history_page()
 
     return render_template(
         "flow-chart.html",
-        history=load_history(),
+        history=history,
+        next_page=next_page,
         image_url=session.pop('flow_image', None),
         prompt_value=session.pop('flow_query', "")
     )
@@ -360,149 +581,194 @@ def flow_chart():
 
 @app.route("/session/<session_id>")
 def load_session(session_id):
-    from modules.flowchart import load_history
+    from modules.flowchart import find_session, load_session_state, flowchart_dot_source
 
-    history = load_history()
-    item = next((x for x in history if x["id"] == session_id), None)
+    item = find_session(session_id, history_owners())
     
     if not item:
         return "Session not found."
 
+    # latest edited version of the session
+    state = load_session_state(item)
+    history, next_page = history_page()
+    if app.config['FLOWCHART_CLIENT_RENDER']:
+        return render_template(
+            "flow-chart.html",
+            dot_source=flowchart_dot_source(state["flowchart"]),
+            export_url=f"/export/{session_id}",
+            prompt_value=item["prompt"],
+            history=history,
+            next_page=next_page
+        )
+
+    image_file = session_image(state)
     return render_template(
         "flow-chart.html",
-        image_url="/" + item["image_file"],
+        image_url="/" + image_file if image_file else None,
         prompt_value=item["prompt"],
-        history=history
+        history=history,
+        next_page=next_page
     )
 
+def session_image(state):
+    # sessions saved in client-side mode have no image yet, and renders can be
+    # evicted: draw it now (render cache)
+    from modules.flowchart import generate_flowchart
+    image_file = state["image_file"]
+    if image_file and os.path.exists(image_file):
+        return image_file
+    fmt = os.path.splitext(image_file)[1].lstrip(".") if image_file else None
+    return generate_flowchart(state["flowchart"], fmt)
+
+@app.route("/export/<session_id>")
+def export_flowchart(session_id):
+    from modules.flowchart import find_session, load_session_state, generate_flowchart
+
+    item = find_session(session_id, history_owners())
+    if not item:
+        return "Session not found."
+
+    image_path = generate_flowchart(load_session_state(item)["flowchart"], request.args.get("format", "svg"))
+    if not image_path:
+        return "Failed to generate flowchart image."
+    return send_artifact(image_path, as_attachment=True, accel=app.config['X_ACCEL_REDIRECT'],
+                         download_name=f"flowchart_{session_id}{os.path.splitext(image_path)[1]}")
+
 @app.route('/edit/<session_id>')
 def edit_flowchart(session_id):
-    from modules.flowchart import load_history
-    history = load_history()
+    from modules.flowchart import (find_session, load_session_state, node_dict, flowchart_dot_source,
+                                   SHAPE_MAP, FILL_COLORS)
 
-    item = next((x for x in history if x["id"] == session_id), None)
+    item = find_session(session_id, history_owners())
 
     if not item:
         return "Session not found"
 
-    # Load JSON data
-    with open(item["json_file"], "r") as f:
-        json_data = json.load(f)
+    # Current version: base JSON + stored edits
+    state = load_session_state(item)
+    json_data = state["flowchart"]
+    json_data["nodes"] = node_dict(json_data)
 
     return render_template(
         "edit-flowchart.html",
         flowchart=json_data,
         session_id=session_id,
-        history=history
+        version=state["version"],
+        client_render=app.config['FLOWCHART_CLIENT_RENDER'],
+        dot_source=flowchart_dot_source(json_data),
+        styles={"shapes": SHAPE_MAP, "fills": FILL_COLORS}
     )
 
-@app.route("/apply-edit/<session_id>", methods=["POST"])
-def apply_edit(session_id):
-    from modules.flowchart import load_history, generate_flowchart, save_full_session
-
-    history = load_history()
-    item = next((x for x in history if x["id"] == session_id), None)
-    if not item:
-        return "Session not found"
+def edit_form_ops(data):
+    """Translate the edit form into one batch of patch ops against data"""
+    ops = []
+    edges = data.get("edges", [])
 
-    # Load JSON flowchart
-    with open(item["json_file"], "r") as f:
-        data = json.load(f)
-
-    nodes = data["nodes"]
-    edges = data["edges"]
-
-    # ==========================
-    # UPDATE EXISTING NODES
-    # ==========================
-    for node_id, node in nodes.items():
+    # existing nodes
+    for node_id, node in data["nodes"].items():
         new_label = request.form.get(f"label_{node_id}")
         new_type = request.form.get(f"type_{node_id}")
+        if (new_label and new_label != node.get("label")) or (new_type and new_type != node.get("type")):
+            ops.append({"op": "update_node", "id": node_id, "label": new_label, "type": new_type})
 
-        if new_label:
-            node["label"] = new_label
-        if new_type:
-            node["type"] = new_type
-
-    # ==========================
-    # ADD NEW NODE
-    # ==========================
-    new_node_id = request.form.get("new_node_id")
-    if new_node_id:
-        nodes[new_node_id] = {
-            "label": request.form.get("new_node_label"),
-            "type": request.form.get("new_node_type")
-        }
-
-    # ==========================
-    # DELETE NODE
-    # ==========================
-    delete_node_id = request.form.get("delete_node_id")
-    if delete_node_id and delete_node_id in nodes:
-        nodes.pop(delete_node_id)
-        # Remove edges referencing the node
-        data["edges"] = [
-            e for e in data["edges"]
-            if e["from"] != delete_node_id and e["to"] != delete_node_id
-        ]
-
-    # ==========================
-    # UPDATE EXISTING EDGES
-    # ==========================
-    edge_count = int(request.form.get("edge_count", 0))
-    new_edges = []
-
-    for i in range(edge_count):
+    # existing edges (by position); a cleared from/to removes the edge
+    removed = []
+    for i in range(min(int(request.form.get("edge_count", 0)), len(edges))):
         frm = request.form.get(f"edge_from_{i}")
         to = request.form.get(f"edge_to_{i}")
-        label = request.form.get(f"edge_label_{i}")
+        label = request.form.get(f"edge_label_{i}", "")
+        if not (frm and to):
+            removed.append(i)
+            continue
+        edge = edges[i]
+        if frm != edge.get("from") or to != edge.get("to") or label != edge.get("label", ""):
+            ops.append({"op": "update_edge", "index": i, "new_from": frm, "new_to": to, "label": label})
+    ops.extend({"op": "remove_edge", "index": i} for i in reversed(removed))
 
-        if frm and to:
-            edge = {"from": frm, "to": to}
-            if label:
-                edge["label"] = label
-            new_edges.append(edge)
-
-    data["edges"] = new_edges
+    new_node_id = request.form.get("new_node_id")
+    if new_node_id:
+        ops.append({"op": "add_node", "id": new_node_id,
+                    "label": request.form.get("new_node_label"), "type": request.form.get("new_node_type")})
 
-    # ==========================
-    # ADD NEW EDGE
-    # ==========================
     new_edge_from = request.form.get("new_edge_from")
     new_edge_to = request.form.get("new_edge_to")
     if new_edge_from and new_edge_to:
-        new_edge = {"from": new_edge_from, "to": new_edge_to}
-        label = request.form.get("new_edge_label")
-        if label:
-            new_edge["label"] = label
-        data["edges"].append(new_edge)
-
-    # ==========================
-    # DELETE EDGE
-    # ==========================
+        ops.append({"op": "add_edge", "from": new_edge_from, "to": new_edge_to,
+                    "label": request.form.get("new_edge_label")})
+
     delete_edge_expr = request.form.get("delete_edge")
     if delete_edge_expr and "→" in delete_edge_expr:
         frm, to = [x.strip() for x in delete_edge_expr.split("→")]
-        data["edges"] = [
-            e for e in data["edges"] if not (e["from"] == frm and e["to"] == to)
-        ]
+        ops.append({"op": "remove_edge", "from": frm, "to": to})
 
-    # ==========================
-    # SAVE UPDATED VERSION
-    # ==========================
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename_base = f"flowcharts/flowchart_edit_{timestamp}"
+    delete_node_id = request.form.get("delete_node_id")
+    if delete_node_id and delete_node_id in data["nodes"]:
+        ops.append({"op": "remove_node", "id": delete_node_id})
 
-    with open(f"{filename_base}.json", "w") as f:
-        json.dump(data, f, indent=2)
+    return ops
 
-    image_path = generate_flowchart(data, filename_base)
+@app.route("/apply-edit/<session_id>", methods=["POST"])
+def apply_edit(session_id):
+    from modules.flowchart import find_session, load_session_state, node_dict, patch_session
 
-    save_full_session("EDIT: " + item["prompt"], data, image_path)
+    item = find_session(session_id, history_owners())
+    if not item:
+        return "Session not found"
 
-    return redirect("/flow-chart")
+    state = load_session_state(item)
+    data = state["flowchart"]
+    data["nodes"] = node_dict(data)
+
+    # the whole form is one batch: one render, one stored version
+    base_version = request.form.get("version", type=int, default=state["version"])
+    _, error = patch_session(item, base_version, edit_form_ops(data),
+                             render=not app.config['FLOWCHART_CLIENT_RENDER'])
+    if error:
+        return error
+
+    return redirect(f"/session/{session_id}")
+
+# JSON edit API: GET the current version, POST batches of patch ops against it
+@app.route("/api/flowchart/<session_id>")
+def flowchart_state(session_id):
+    from modules.flowchart import find_session, load_session_state
+
+    item = find_session(session_id, history_owners())
+    if not item:
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify(flowchart_payload(load_session_state(item)))
+
+def flowchart_payload(state):
+    from modules.flowchart import flowchart_dot_source
+    # image_url is null when the chart is drawn client-side (use dot, or /export for a file)
+    image_file = session_image(state) if state["image_file"] else None
+    return {"version": state["version"], "flowchart": state["flowchart"],
+            "dot": flowchart_dot_source(state["flowchart"]),
+            "image_url": "/" + image_file if image_file else None}
+
+@app.route("/api/flowchart/<session_id>/patch", methods=["POST"])
+def patch_flowchart(session_id):
+    from modules.flowchart import find_session, patch_session
+
+    item = find_session(session_id, history_owners())
+    if not item:
+        return jsonify({"error": "Session not found"}), 404
+
+    body = request.get_json(silent=True) or {}
+    ops = body.get("ops")
+    if not isinstance(body.get("version"), int) or not isinstance(ops, list):
+        return jsonify({"error": "Expected {\"version\": <int>, \"ops\": [...]}"}), 400
+
+    state, error = patch_session(item, body["version"], ops, render=not app.config['FLOWCHART_CLIENT_RENDER'])
+    if error:
+        # state is only returned with a version conflict: send the current version back
+        if state:
+            return jsonify({"error": error, "version": state["version"]}), 409
+        return jsonify({"error": error}), 400
+    return jsonify(flowchart_payload(state))
 
 
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # development server only; production runs gunicorn -c gunicorn.conf.py
+    app.run(host="0.0.0.0", port=5000, debug=os.getenv('FLASK_DEBUG', '0') == '1')
@@ -0,0 +1,80 @@
+"""
+Gantt date parser check + benchmark.
+
+Verifies that parse_date_column returns exactly what
+column.apply(smart_date_parse) returns (values and dtype) for every column in
+date_corpus.json, for datetime cells as openpyxl yields them, and for large
+random columns in each supported format. Then times both on those columns.
+
+Usage: python benchmarks/date_parse_benchmark.py [rows]
+"""
+import os
+import sys
+import json
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from modules.ganttchart import DATE_FORMATS, parse_date_column, smart_date_parse
+
+CORPUS_FILE = os.path.join(ROOT, "benchmarks", "date_corpus.json")
+
+
+def corpus_columns():
+    with open(CORPUS_FILE, "r", encoding="utf-8") as f:
+        columns = {name: pd.Series(values, dtype=object) for name, values in json.load(f).items()}
+    # what openpyxl yields for date cells, alone and mixed with text
+    columns["datetime_cells"] = pd.Series([datetime(2024, 1, 5), datetime(2024, 1, 5, 10, 30, 0, 250000), None], dtype=object)
+    columns["datetime_and_strings"] = pd.Series([datetime(2024, 1, 5), "05/01/2024", 45296, ""], dtype=object)
+    columns["datetime64"] = pd.Series(pd.to_datetime(["2024-01-05 10:30:00.123456789", None]))
+    columns["numeric_dtype"] = pd.Series([45296, 45297, 45658])
+    return columns
+
+
+def random_column(fmt, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime(2020, 1, 1)
+    return pd.Series([(start + timedelta(days=int(d))).strftime(fmt) for d in rng.integers(0, 3650, rows)], dtype=object)
+
+
+def same(expected, got):
+    return expected.dtype == got.dtype and expected.equals(got)
+
+
+def check(columns):
+    failures = 0
+    for name, column in columns.items():
+        expected = column.apply(smart_date_parse)
+        got = parse_date_column(column)
+        if not same(expected, got):
+            failures += 1
+            print(f"MISMATCH for {name}\n  expected ({expected.dtype}): {expected.tolist()}\n  got ({got.dtype}):      {got.tolist()}")
+    print(f"Date parser: {len(columns) - failures}/{len(columns)} columns identical to smart_date_parse")
+    return failures == 0
+
+
+def measure(label, column):
+    started = time.perf_counter()
+    column.apply(smart_date_parse)
+    per_cell = time.perf_counter() - started
+    started = time.perf_counter()
+    parse_date_column(column)
+    vectorized = time.perf_counter() - started
+    print(f"{label:<12} {len(column):>8,} rows  {per_cell:8.3f} s  {vectorized:8.3f} s  {per_cell / vectorized:6.1f}x")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    columns = corpus_columns()
+    generated = {fmt: random_column(fmt, rows, seed=i) for i, fmt in enumerate(DATE_FORMATS)}
+    generated["serials"] = pd.Series(np.random.default_rng(0).integers(40000, 50000, rows).tolist(), dtype=object)
+    if not check({**columns, **generated}):
+        sys.exit(1)
+    print(f"{'format':<12} {'rows':>13}  {'per-cell':>8}  {'column':>8}  {'speedup':>6}")
+    for label, column in generated.items():
+        measure(label, column)
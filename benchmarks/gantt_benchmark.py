@@ -0,0 +1,124 @@
+"""
+Gantt grid writer benchmark.
+
+Times write_gantt_sheet (interval spans + one merged range per task) against
+the previous per-cell double loop for growing task counts and horizons, after
+checking on a small plan that both fill exactly the same cells.
+
+Usage: python benchmarks/gantt_benchmark.py [max_tasks] [max_horizon_days]
+"""
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from openpyxl import load_workbook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from modules.ganttchart import write_gantt_sheet
+
+# the per-cell loop is O(tasks x days); skip it beyond this many comparisons
+LEGACY_CELL_LIMIT = 2_000_000
+
+
+def make_plan(tasks, horizon_days, seed=0):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-01")
+    offsets = rng.integers(0, horizon_days, tasks)
+    lengths = rng.integers(0, max(2, horizon_days // 6), tasks)
+    df = pd.DataFrame({
+        "Task": [f"Task {i}" for i in range(tasks)],
+        "Start Date": start + pd.to_timedelta(offsets, unit="D"),
+    })
+    df["End Date"] = df["Start Date"] + pd.to_timedelta(lengths, unit="D")
+    all_dates = pd.date_range(df["Start Date"].min(), df["End Date"].max())
+    return df, all_dates
+
+
+def legacy_write_gantt_sheet(workbook, df, all_dates):
+    gantt_sheet = workbook.add_worksheet("Gantt Chart")
+    gantt_sheet.write(0, 0, "Task")
+    for i, d in enumerate(all_dates):
+        gantt_sheet.write(0, i + 1, d.strftime("%Y-%m-%d"))
+    fill_fmt = workbook.add_format({"bg_color": "#4F81BD"})
+    for r, row in df.iterrows():
+        gantt_sheet.write(r + 1, 0, row["Task"])
+        for c, d in enumerate(all_dates):
+            if row["Start Date"] <= d <= row["End Date"]:
+                gantt_sheet.write(r + 1, c + 1, "", fill_fmt)
+    gantt_sheet.set_column(0, 0, 30)
+    gantt_sheet.set_column(1, len(all_dates), 12)
+
+
+def build(write, df, all_dates):
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {"in_memory": True})
+    started = time.perf_counter()
+    write(workbook, df, all_dates)
+    workbook.close()
+    return time.perf_counter() - started, buffer
+
+
+def filled_cells(buffer):
+    sheet = load_workbook(buffer)["Gantt Chart"]
+    header = [c.value for c in sheet[1]]
+    tasks = [c.value for c in sheet["A"]]
+    filled = set()
+    for row in sheet.iter_rows(min_row=2):
+        for cell in row[1:]:
+            if cell.fill.fgColor.rgb not in (None, "00000000"):
+                filled.add((cell.row, cell.column))
+    # only the top-left cell of a merged range carries its format
+    for merged in sheet.merged_cells.ranges:
+        if (merged.min_row, merged.min_col) in filled:
+            filled.update(merged.cells)
+    return header, tasks, filled
+
+
+def check_equivalence():
+    df, all_dates = make_plan(60, 120, seed=1)
+    # a task with a time of day, and one that ends before it starts
+    df.loc[3, "Start Date"] += pd.Timedelta(hours=10)
+    df.loc[4, "End Date"] = df.loc[4, "Start Date"] - pd.Timedelta(days=2)
+    weekdays = all_dates[all_dates.weekday < 5]
+    # the grid works on whole days (like the working-day durations), so the
+    # reference loop is given day-normalized dates
+    by_day = df.assign(**{c: df[c].dt.normalize() for c in ("Start Date", "End Date")})
+    # a weekend-only task with weekends excluded: no grid columns at all
+    weekend = pd.DataFrame({"Task": ["Weekend job"], "Start Date": [pd.Timestamp("2024-06-01")],
+                            "End Date": [pd.Timestamp("2024-06-02")]})
+    weekend_days = pd.date_range("2024-06-01", "2024-06-02")
+    cases = [(df, by_day, all_dates), (df, by_day, weekdays),
+             (weekend, weekend, weekend_days[weekend_days.weekday < 5])]
+    for plan, plan_by_day, dates in cases:
+        _, new = build(write_gantt_sheet, plan, dates)
+        _, old = build(legacy_write_gantt_sheet, plan_by_day, dates)
+        if filled_cells(new) != filled_cells(old):
+            print("MISMATCH between write_gantt_sheet and the per-cell loop")
+            return False
+    print("Filled cells identical to the per-cell loop")
+    return True
+
+
+if __name__ == "__main__":
+    max_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_horizon = int(sys.argv[2]) if len(sys.argv) > 2 else 1095
+    if not check_equivalence():
+        sys.exit(1)
+
+    print(f"{'tasks':>7} {'days':>6} {'filled':>10} {'spans (s)':>10} {'per-cell (s)':>13}")
+    for tasks in (t for t in (100, 500, 2000, 5000) if t <= max_tasks):
+        for horizon in (h for h in (90, 365, 1095) if h <= max_horizon):
+            df, all_dates = make_plan(tasks, horizon)
+            filled = int(((df["End Date"] - df["Start Date"]).dt.days + 1).sum())
+            new_time, _ = build(write_gantt_sheet, df, all_dates)
+            if tasks * len(all_dates) <= LEGACY_CELL_LIMIT:
+                old_time = f"{build(legacy_write_gantt_sheet, df, all_dates)[0]:13.2f}"
+            else:
+                old_time = f"{'-':>13}"
+            print(f"{tasks:>7} {len(all_dates):>6} {filled:>10,} {new_time:10.2f} {old_time}")
@@ -0,0 +1,130 @@
+"""
+Local load test for the production server profile.
+
+Starts gunicorn with gunicorn.conf.py for 1, 2, 4, ... worker processes (up
+to max_workers, default the CPU count) and hammers one page with keep-alive
+clients for a fixed time, printing throughput and latency per worker count.
+The default page, /flow-chart, renders a template over a SQLite history
+query, so it is CPU-bound in Python and should scale with worker processes
+until the clients and the server compete for the same cores.
+
+Every run uses throwaway databases, so the local history is not touched.
+
+Usage: python benchmarks/load_test.py [max_workers] [seconds] [path]
+"""
+import http.client
+import multiprocessing
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 5099
+THREADS = 4
+STARTUP_TIMEOUT = 120
+
+
+def wait_for_port(port, timeout=STARTUP_TIMEOUT):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def start_server(workers, port, workdir):
+    env = dict(os.environ,
+               FLASK_SECRET_KEY=secrets.token_hex(32),
+               FLOWCHART_HISTORY_DB=os.path.join(workdir, "history.db"),
+               SESSION_DB=os.path.join(workdir, "sessions.db"),
+               STREAM_DB=os.path.join(workdir, "streams.db"),
+               WEB_WORKERS=str(workers),
+               WEB_THREADS=str(THREADS),
+               WEB_BIND=f"127.0.0.1:{port}")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port(port):
+        server.kill()
+        raise RuntimeError(f"gunicorn with {workers} workers did not start")
+    return server
+
+
+def client(args):
+    """One keep-alive connection requesting path until the deadline; returns latencies and errors."""
+    port, path, deadline = args
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies = []
+    errors = 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies, errors
+
+
+def run_load(port, path, seconds, clients):
+    # warm up every worker before measuring
+    client((port, path, time.time() + 1))
+    deadline = time.time() + seconds
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(client, [(port, path, deadline)] * clients)
+    latencies = np.concatenate([np.array(l) for l, _ in results]) if results else np.array([])
+    errors = sum(e for _, e in results)
+    return latencies, errors
+
+
+def main():
+    cores = os.cpu_count() or 1
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else cores
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    path = sys.argv[3] if len(sys.argv) > 3 else "/flow-chart"
+
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+
+    print(f"GET {path} for {seconds:g}s per run, {cores} cores, {THREADS} threads per worker")
+    print(f"{'workers':>7}  {'clients':>7}  {'req/s':>8}  {'p50 ms':>7}  {'p95 ms':>7}  {'errors':>6}  {'speedup':>7}")
+    baseline = None
+    for workers in counts:
+        clients = max(4, 2 * workers)
+        with tempfile.TemporaryDirectory() as workdir:
+            server = start_server(workers, PORT, workdir)
+            try:
+                latencies, errors = run_load(PORT, path, seconds, clients)
+            finally:
+                server.terminate()
+                server.wait()
+        throughput = len(latencies) / seconds
+        baseline = baseline or throughput
+        p50, p95 = (np.percentile(latencies, [50, 95]) * 1000) if len(latencies) else (float("nan"),) * 2
+        print(f"{workers:>7}  {clients:>7}  {throughput:>8.1f}  {p50:>7.1f}  {p95:>7.1f}  {errors:>6}  "
+              f"{throughput / baseline if baseline else 0:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Cold-start benchmark for app.py.
+
+Each run is a fresh interpreter, like a new gunicorn worker. Every run
+measures wall time and peak RSS at three points:
+  app      - `import app` (the lazy path: tool modules not loaded yet)
+  request  - plus one GET /flow-chart through the test client
+  preload  - plus wsgi.create_app(), i.e. every tool module, the templates
+             and the fonts a preloading master loads before forking
+It then prints the median of the runs and the slowest top-level imports of
+`import app` from `python -X importtime`.
+
+Usage: python benchmarks/startup_benchmark.py [runs] [top_imports]
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, resource, sys, time
+marks = {}
+def mark(name):
+    marks[name] = (time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+start = time.perf_counter()
+import app
+mark("app")
+app.app.test_client().get("/flow-chart")
+mark("request")
+import wsgi
+wsgi.preload(app.app)
+mark("preload")
+print(json.dumps(marks))
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def child_env(workdir):
+    return dict(os.environ,
+                PYTHONPATH=ROOT,
+                FLASK_SECRET_KEY="startup-benchmark",
+                FLOWCHART_HISTORY_DB=os.path.join(workdir, "history.db"),
+                SESSION_DB=os.path.join(workdir, "sessions.db"),
+                STREAM_DB=os.path.join(workdir, "streams.db"))
+
+
+def cold_start(workdir):
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=child_env(workdir),
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def import_profile(workdir, top):
+    """Slowest packages imported directly by app.py: (cumulative ms, self ms, name)."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT,
+                         env=child_env(workdir), capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3))
+        # children are listed before their parent: collect depth-3 lines until the
+        # depth-1 line that owns them, and keep them if that line is app
+        if depth == 3:
+            rows.append((int(match.group(2)) / 1000, int(match.group(1)) / 1000, match.group(4)))
+        elif depth == 1 and match.group(4) == "app":
+            rows.sort(reverse=True)
+            return int(match.group(2)) / 1000, rows[:top]
+        elif depth == 1:
+            rows = []
+    raise RuntimeError("no importtime line for app")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [cold_start(workdir) for _ in range(runs)]
+        total, rows = import_profile(workdir, top)
+
+    print(f"Cold start, median of {runs} fresh interpreters")
+    print(f"{'stage':>8}  {'seconds':>8}  {'peak RSS MB':>11}")
+    for stage in ("app", "request", "preload"):
+        seconds = np.median([r[stage][0] for r in results])
+        rss = np.median([r[stage][1] for r in results])
+        print(f"{stage:>8}  {seconds:>8.3f}  {rss:>11.1f}")
+
+    print(f"\nimport app: {total:.1f} ms (-X importtime); slowest direct imports:")
+    print(f"{'cumul ms':>9}  {'self ms':>8}  module")
+    for cumulative, own, name in rows:
+        print(f"{cumulative:>9.1f}  {own:>8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# gunicorn.conf.py
+# Production server settings: gunicorn -c gunicorn.conf.py
+# Every value can be overridden from the environment (see productivity-app.service).
+import os
+import multiprocessing
+
+wsgi_app = "wsgi:create_app()"
+bind = os.getenv("WEB_BIND", "127.0.0.1:5000")
+
+# one process per core for CPU-bound work (charts, OCR, rendering) ...
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count()))
+# ... and threads for requests that mostly wait (Bedrock calls, SSE followers)
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+# SSE followers may use at most STREAM_MAX_FOLLOWERS of these threads
+# (default: half; see modules/bedrock_stream.py)
+
+# import the app and its tool modules once in the master; workers share them
+# copy-on-write (WEB_PRELOAD=0: workers import each tool on first use instead).
+# The master keeps that code, so a HUP does not pick up a deploy: restart instead
+preload_app = os.getenv("WEB_PRELOAD", "1") == "1"
+
+# document OCR and model calls can take minutes
+timeout = int(os.getenv("WEB_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def child_exit(server, worker):
+    # keep an exited worker's counters in /metrics (modules/metrics.py)
+    from modules.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,345 @@
+# modules/bedrock_stream.py
+# Shared streaming path for Bedrock (invoke_model_with_response_stream) and
+# the text streams the /stream/<id> server-sent-events endpoint follows. Stream
+# events are also written to STREAM_DB so a stream started in one worker
+# process can be followed from any other.
+import os
+import json
+import time
+import random
+import secrets
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import sqlite_util
+from modules.metrics import timer, record_bedrock
+
+REGION = "ap-south-1"
+DEFAULT_MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+STREAM_LIMIT = 500
+# seconds between keep-alive comments while a stream is idle
+KEEPALIVE_SECONDS = 15
+# shared event log ("" keeps streams in memory only: single-process setups)
+STREAM_DB = os.getenv("STREAM_DB", "streams.db")
+STREAM_POLL_SECONDS = 0.5
+# text deltas are logged in batches: every STREAM_LOG_BATCH events or
+# STREAM_LOG_SECONDS, whichever comes first (other events are logged at once)
+STREAM_LOG_BATCH = 32
+STREAM_LOG_SECONDS = 0.1
+# streams older than this are purged and no longer followed
+STREAM_MAX_AGE_SECONDS = 3600
+PURGE_CHANCE = 0.01
+# Every SSE follower holds one gunicorn thread until its stream ends. At most
+# STREAM_MAX_FOLLOWERS follow at once per worker process (default: half of
+# WEB_THREADS), so the other threads always serve ordinary requests; a
+# follower stops after STREAM_IDLE_SECONDS without events (writer gone).
+STREAM_MAX_FOLLOWERS = int(os.getenv("STREAM_MAX_FOLLOWERS", str(max(1, int(os.getenv("WEB_THREADS", "8")) // 2))))
+STREAM_IDLE_SECONDS = int(os.getenv("STREAM_IDLE_SECONDS", "300"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS streams (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS streams_created ON streams (created);
+CREATE TABLE IF NOT EXISTS stream_events (
+    stream_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (stream_id, seq)
+);
+"""
+
+STREAMS = {}
+STREAMS_LOCK = threading.Lock()
+STREAM_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+FOLLOWER_SLOTS = threading.BoundedSemaphore(STREAM_MAX_FOLLOWERS)
+CLIENTS = {}
+
+
+def aws_client(service, region_name=None):
+    """
+    One boto3 client per service and process (clients are thread-safe),
+    created on first use; boto3 itself is only imported then too.
+    """
+    key = (service, region_name)
+    if key not in CLIENTS:
+        import boto3
+        CLIENTS.setdefault(key, boto3.client(service, region_name=region_name))
+    return CLIENTS[key]
+
+
+def bedrock_client():
+    return aws_client("bedrock-runtime", REGION)
+
+
+def stream_model_text(prompt, model_id=DEFAULT_MODEL_ID, max_tokens=1000, stage="model", **params):
+    """
+    Yield the completion for prompt (a string or a content list) as text
+    deltas, as Bedrock produces them. Latency and token usage are recorded
+    under stage.
+    """
+    body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+        **params,
+    }
+    usage = {}
+    try:
+        with timer(stage, model=model_id):
+            response = bedrock_client().invoke_model_with_response_stream(
+                modelId=model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps(body),
+            )
+            for event in response["body"]:
+                chunk = event.get("chunk")
+                if not chunk:
+                    continue
+                message = json.loads(chunk["bytes"])
+                kind = message.get("type")
+                # input tokens arrive with message_start, the output count with message_delta
+                if kind == "message_start":
+                    usage.update(message["message"].get("usage", {}))
+                elif kind == "message_delta":
+                    usage.update(message.get("usage", {}))
+                elif kind == "content_block_delta" and message["delta"].get("type") == "text_delta":
+                    yield message["delta"]["text"]
+    finally:
+        record_bedrock(stage, model_id, usage.get("input_tokens"), usage.get("output_tokens"))
+
+
+def model_text(prompt, stream=None, **kwargs):
+    """Full completion text; each delta is also appended to stream when given."""
+    parts = []
+    for text in stream_model_text(prompt, **kwargs):
+        parts.append(text)
+        if stream is not None:
+            stream.append(text)
+    return "".join(parts)
+
+
+def connection(db_path=STREAM_DB):
+    return sqlite_util.connection(db_path, SCHEMA)
+
+
+class TextStream:
+    """
+    Append-only list of events ("text", "reset", "progress", "done", "error")
+    that any number of readers can follow from the start while it grows.
+    """
+
+    def __init__(self, stream_id=None, db_path=STREAM_DB):
+        self.stream_id = stream_id
+        self.db_path = db_path
+        self.events = []
+        self.length = 0  # characters of text currently shown
+        self.closed = False
+        self.changed = threading.Condition()
+        self.logged = 0  # events already in STREAM_DB
+        self.logged_at = time.monotonic()
+        self.log_lock = threading.Lock()
+
+    def push(self, kind, data):
+        with self.changed:
+            self.events.append((kind, data))
+            if kind in ("done", "error"):
+                self.closed = True
+            self.changed.notify_all()
+        if (kind != "text" or len(self.events) - self.logged >= STREAM_LOG_BATCH
+                or time.monotonic() - self.logged_at >= STREAM_LOG_SECONDS):
+            self.flush_log()
+
+    def flush_log(self):
+        """Write the events not yet in STREAM_DB in one transaction, outside the followers' lock."""
+        # a failing log only costs followers in other processes, not this stream
+        if not (self.stream_id and self.db_path):
+            return
+        with self.log_lock:
+            with self.changed:
+                start, pending = self.logged, self.events[self.logged:]
+            if not pending:
+                return
+            rows = [(self.stream_id, start + i, kind, json.dumps(data)) for i, (kind, data) in enumerate(pending)]
+            try:
+                with connection(self.db_path) as conn:
+                    conn.executemany("INSERT INTO stream_events (stream_id, seq, kind, data) VALUES (?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                print(f"Could not log stream {self.stream_id} events: {e}")
+                return
+            self.logged = start + len(pending)
+            self.logged_at = time.monotonic()
+
+    def append(self, text):
+        if text:
+            with self.changed:
+                self.length += len(text)
+            self.push("text", text)
+
+    def truncate(self, length):
+        """Drop text after length (a retried model call restarts its part)."""
+        if length < self.length:
+            with self.changed:
+                self.length = length
+            self.push("reset", length)
+
+    def progress(self, data):
+        self.push("progress", data)
+
+    def finish(self, result=None):
+        self.push("done", result or {})
+
+    def fail(self, message):
+        self.push("error", {"error": message})
+
+    def outcome(self):
+        """The final ("done" or "error") event, or None while the stream is open."""
+        with self.changed:
+            return self.events[-1] if self.closed else None
+
+    def follow(self, timeout=KEEPALIVE_SECONDS):
+        """Yield every event, waiting for new ones; None after timeout seconds of silence."""
+        index = 0
+        while True:
+            with self.changed:
+                if index >= len(self.events) and not self.closed:
+                    self.changed.wait(timeout)
+                pending = self.events[index:]
+                closed = self.closed
+            if not pending:
+                if closed:
+                    return
+                yield None
+                continue
+            index += len(pending)
+            yield from pending
+
+
+class StoredStream:
+    """Read-only view of a stream that another process writes to STREAM_DB."""
+
+    def __init__(self, stream_id, created, db_path=STREAM_DB):
+        self.stream_id = stream_id
+        self.created = created
+        self.db_path = db_path
+
+    def events_after(self, seq):
+        rows = connection(self.db_path).execute(
+            "SELECT seq, kind, data FROM stream_events WHERE stream_id = ? AND seq > ? ORDER BY seq",
+            (self.stream_id, seq))
+        return [(s, kind, json.loads(data)) for s, kind, data in rows]
+
+    def outcome(self):
+        row = connection(self.db_path).execute(
+            "SELECT kind, data FROM stream_events WHERE stream_id = ? AND kind IN ('done', 'error')",
+            (self.stream_id,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def follow(self, timeout=KEEPALIVE_SECONDS):
+        """Same events as TextStream.follow, polled from the database."""
+        seq = -1
+        idle = 0
+        while True:
+            pending = self.events_after(seq)
+            for seq, kind, data in pending:
+                yield kind, data
+                if kind in ("done", "error"):
+                    return
+            if pending:
+                idle = 0
+                continue
+            # the writing process may have died; don't follow forever
+            if time.time() - self.created > STREAM_MAX_AGE_SECONDS:
+                return
+            time.sleep(STREAM_POLL_SECONDS)
+            idle += STREAM_POLL_SECONDS
+            if idle >= timeout:
+                idle = 0
+                yield None
+
+
+def new_stream(stream_id=None):
+    """Register a TextStream (under stream_id or a fresh random id); returns (id, stream)."""
+    stream_id = stream_id or secrets.token_hex(8)
+    stream = TextStream(stream_id)
+    with STREAMS_LOCK:
+        STREAMS[stream_id] = stream
+        # forget the oldest streams (dicts keep insertion order)
+        while len(STREAMS) > STREAM_LIMIT:
+            STREAMS.pop(next(iter(STREAMS)))
+    if STREAM_DB:
+        register_stream(stream_id)
+    return stream_id, stream
+
+
+def register_stream(stream_id, db_path=STREAM_DB):
+    now = time.time()
+    try:
+        with connection(db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO streams (id, created) VALUES (?, ?)", (stream_id, now))
+            if random.random() < PURGE_CHANCE:
+                cutoff = now - STREAM_MAX_AGE_SECONDS
+                conn.execute("DELETE FROM stream_events WHERE stream_id IN (SELECT id FROM streams WHERE created < ?)",
+                             (cutoff,))
+                conn.execute("DELETE FROM streams WHERE created < ?", (cutoff,))
+    except sqlite3.Error as e:
+        print(f"Could not register stream {stream_id}: {e}")
+
+
+def get_stream(stream_id):
+    """This process's stream, else the logged one another worker is writing, else None."""
+    stream = STREAMS.get(stream_id)
+    if stream is not None or not STREAM_DB:
+        return stream
+    row = connection().execute("SELECT created FROM streams WHERE id = ?", (stream_id,)).fetchone()
+    return StoredStream(stream_id, row[0]) if row else None
+
+
+def start_stream_job(target, *args, **kwargs):
+    """
+    Run target(stream, *args, **kwargs) in the background and return the
+    stream id. Its return value (a dict) is sent as the "done" event.
+    """
+    stream_id, stream = new_stream()
+
+    def run():
+        try:
+            stream.finish(target(stream, *args, **kwargs))
+        except Exception as e:
+            print(f"Stream job {stream_id} failed: {e}")
+            stream.fail(str(e))
+
+    STREAM_EXECUTOR.submit(run)
+    return stream_id
+
+
+def acquire_follower_slot():
+    """One of the STREAM_MAX_FOLLOWERS slots, or False when all are taken (release it when done)."""
+    return FOLLOWER_SLOTS.acquire(blocking=False)
+
+
+def release_follower_slot():
+    FOLLOWER_SLOTS.release()
+
+
+def sse_events(stream):
+    """
+    Server-sent-events body for a stream (keep-alive comments while idle).
+    Ends with the stream's "done"/"error" event, or with an "error" event of
+    its own after STREAM_IDLE_SECONDS without any event.
+    """
+    last_event = time.monotonic()
+    for event in stream.follow():
+        if event is not None:
+            last_event = time.monotonic()
+            kind, data = event
+            yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+            continue
+        if time.monotonic() - last_event >= STREAM_IDLE_SECONDS:
+            yield f"event: error\ndata: {json.dumps({'error': 'No progress for a while; please try again.'})}\n\n"
+            return
+        yield ": keep-alive\n\n"
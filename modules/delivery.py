@@ -0,0 +1,64 @@
+# modules/delivery.py
+# Serving generated artifacts (audio, Excel, images, text): strong ETags
+# from file metadata, HTTP Range support, and optional X-Accel-Redirect
+# handoff so nginx sends the bytes instead of a Python worker.
+import os
+from urllib.parse import quote
+
+from flask import abort, send_file
+from werkzeug.security import safe_join
+
+# internal nginx locations under this prefix map onto APP_ROOT, e.g.
+#   location /protected/static/ { internal; alias /home/ubuntu/OneEmcureProductivityApp/static/; }
+ACCEL_PREFIX = os.getenv("X_ACCEL_PREFIX", "/protected/")
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def strong_etag(path):
+    """
+    ETag from (inode, size, mtime_ns), without reading the file: artifacts
+    are written once under unique names or replaced with os.replace (a new
+    inode), and a rewrite in place changes the size or mtime, so a given
+    ETag always stands for the same bytes, which is what Range/If-Range needs.
+    """
+    st = os.stat(path)
+    return f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def accel_path(path):
+    """The X-Accel-Redirect URI for a file under APP_ROOT, or None if it lies elsewhere."""
+    relative = os.path.relpath(os.path.abspath(path), APP_ROOT)
+    if relative.startswith(os.pardir):
+        return None
+    return ACCEL_PREFIX + quote(relative.replace(os.sep, "/"))
+
+
+def send_artifact(path, accel=False, as_attachment=False, download_name=None, max_age=None):
+    """
+    Response for a file on disk: 304 on a matching If-None-Match, 206 for a
+    Range request, otherwise the whole file. With accel=True only headers
+    are sent and nginx streams the file (and serves the ranges) itself.
+    """
+    if not os.path.isfile(path):
+        abort(404)
+    etag = strong_etag(path)
+    response = send_file(path, as_attachment=as_attachment, download_name=download_name,
+                         etag=etag, max_age=max_age, conditional=True)
+    redirect_to = accel_path(path) if accel else None
+    # 304s and errors are already complete; only hand off real file bodies
+    if redirect_to and response.status_code in (200, 206):
+        response.close()
+        response.status_code = 200
+        response.response = []
+        response.headers.pop("Content-Range", None)
+        response.headers["Content-Length"] = "0"
+        response.headers["X-Accel-Redirect"] = redirect_to
+    return response
+
+
+def send_from_folder(folder, filename, **kwargs):
+    """send_artifact for filename inside folder (404 if it escapes the folder)."""
+    path = safe_join(folder, filename)
+    if path is None:
+        abort(404)
+    return send_artifact(path, **kwargs)
@@ -1,92 +1,130 @@
-import boto3
 import json
+import re
 import graphviz
 import os
 from datetime import datetime
+import hashlib
+import secrets
 import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from modules.bedrock_stream import stream_model_text
+from modules.workspace import unique_name, job_id
+from modules.result_cache import cache_key, load_cached, store_cached
+from modules.metrics import timer
+from modules.history_store import add_session, get_session, list_sessions, add_edit, list_edits, latest_snapshot
 
 # =========================
 # DIRECTORIES
 # =========================
 FLOWCHART_DIR = "flowcharts"
-HISTORY_FILE = "last_flowchart.json"
 
-HISTORY_INDEX = "chat_history.json"
 HISTORY_DIR = "static/history"
+# rendered flowcharts, one file per canonical graph hash (served from /static)
+RENDER_DIR = "static/renders"
+RENDER_FORMATS = ("jpg", "png", "svg")
+# part of the render cache key: bump when the drawing of a graph changes
+RENDER_CACHE_VERSION = "2"
+FLOWCHART_FORMAT = os.getenv("FLOWCHART_FORMAT", "jpg")
+
+# dot runs as a child process: bounded concurrency, timeout, CPU/memory caps
+DOT_BINARY = os.getenv("GRAPHVIZ_DOT", "dot")
+# util-linux prlimit sets the caps and execs dot: no Python code runs in the
+# forked child, which preexec_fn would do (unsafe in threaded workers)
+PRLIMIT_BINARY = shutil.which("prlimit")
+FLOWCHART_RENDER_WORKERS = int(os.getenv("FLOWCHART_RENDER_WORKERS", "2"))
+RENDER_SLOTS = threading.BoundedSemaphore(FLOWCHART_RENDER_WORKERS)
+RENDER_QUEUE_SECONDS = 30
+RENDER_TIMEOUT_SECONDS = int(os.getenv("FLOWCHART_RENDER_TIMEOUT", "20"))
+RENDER_MEMORY_MB = int(os.getenv("FLOWCHART_RENDER_MEMORY_MB", "1024"))
+FLOWCHART_MAX_NODES = int(os.getenv("FLOWCHART_MAX_NODES", "400"))
+FLOWCHART_MAX_EDGES = int(os.getenv("FLOWCHART_MAX_EDGES", "1200"))
+# nodes + edges above which the cheaper SVG layout is used
+FLOWCHART_LARGE_GRAPH = int(os.getenv("FLOWCHART_LARGE_GRAPH", "300"))
 
 os.makedirs(FLOWCHART_DIR, exist_ok=True)
 os.makedirs(HISTORY_DIR, exist_ok=True)
+os.makedirs(RENDER_DIR, exist_ok=True)
 
-# AWS Client
-bedrock = boto3.client('bedrock-runtime', region_name='ap-south-1')
+if PRLIMIT_BINARY is None:
+    print("WARNING: prlimit not found; dot renders run without CPU/memory limits (timeout only)")
 
 # =========================
 # CHAT HISTORY SAVE / LOAD
 # =========================
 
-def load_history():
-    """Load master chat history list"""
-    if os.path.exists(HISTORY_INDEX):
-        with open(HISTORY_INDEX, "r") as f:
-            return json.load(f)
-    return []
+def load_history(owner="", before=None):
+    """One sidebar page of owner's sessions (owner may be a tuple; newest first) and the cursor for the next page"""
+    return list_sessions(owner, before=before)
 
-def save_full_session(prompt, flowchart_json_data, image_path):
+def find_session(session_id, owner=""):
+    """History entry by id, only if it belongs to owner (or one of a tuple of owners)"""
+    return get_session(session_id, owner)
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def save_full_session(prompt, flowchart_json_data, image_path, owner=""):
     """Save prompt + JSON + image into a session folder"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    session_id = f"session_{timestamp}"
+    # random suffix: two generations in the same second must not share files
+    session_id = f"session_{job_id()}"
 
     json_path = os.path.join(HISTORY_DIR, f"{session_id}.json")
-    image_output = os.path.join(HISTORY_DIR, f"{session_id}.jpg")
 
     # Save JSON file
-    with open(json_path, "w") as f:
-        json.dump(flowchart_json_data, f, indent=2)
-
-    # Copy image
-    shutil.copy(image_path, image_output)
+    write_json_atomic(json_path, flowchart_json_data)
 
     # Prepare entry
     entry = {
         "id": session_id,
         "prompt": prompt,
         "json_file": json_path,
-        "image_file": image_output,
+        # the render cache artifact itself: identical graphs share one image
+        "image_file": image_path,
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
 
-    # Load, update and rewrite index
-    history_list = load_history()
-    history_list.insert(0, entry)
-
-    with open(HISTORY_INDEX, "w") as f:
-        json.dump(history_list, f, indent=2)
-
-    return entry
+    # single indexed insert instead of rewriting the whole index
+    return add_session(entry, owner)
 
 
 # =========================
 # MODEL CALLING
 # =========================
 
-def call_haiku(prompt: str):
+FLOWCHART_MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+# a flowchart completion still arriving after this is abandoned; a stalled
+# stream fails on its own after botocore's read timeout
+FLOWCHART_MODEL_TIMEOUT = int(os.getenv("FLOWCHART_MODEL_TIMEOUT", "120"))
+BEDROCK_READ_TIMEOUT = 60
+
+def call_haiku(prompt: str, on_text=None):
+    """Streamed Haiku call; on_text(text so far) runs after every delta"""
     try:
-        response = bedrock.invoke_model(
-            modelId="anthropic.claude-3-haiku-20240307-v1:0",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 1000
-            })
-        )
-        result = json.loads(response['body'].read().decode())
-        return result['content'][0]['text']
+        parts = []
+        deadline = time.monotonic() + FLOWCHART_MODEL_TIMEOUT
+        for text in stream_model_text(prompt, model_id=FLOWCHART_MODEL_ID, max_tokens=1000, stage="flowchart_model"):
+            parts.append(text)
+            if on_text:
+                on_text("".join(parts))
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"no complete response after {FLOWCHART_MODEL_TIMEOUT}s")
+        return "".join(parts)
     except Exception as e:
         print("Error calling Haiku:", e)
         return None
 
+def partial_flowchart_counts(text):
+    """Nodes/edges seen so far in a flowchart JSON that is still arriving (approximate)"""
+    nodes = len(re.findall(r'"type"\s*:', text))
+    edges = len(re.findall(r'"(?:from|source)"\s*:', text))
+    return nodes, edges
+
 def extract_json_from_response(text):
     start = text.find('{')
     end = text.rfind('}')
@@ -108,113 +146,482 @@ def parse_haiku_output(output_text):
 # FLOWCHART GENERATION
 # =========================
 
-def generate_flowchart(data, filename_base):
-    dot = graphviz.Digraph(format='jpg')
-    dot.attr(rankdir='TB')
-
-    nodes = data.get("nodes", {})
+SHAPE_MAP = {
+    "start": "oval",
+    "end": "oval",
+    "input": "parallelogram",
+    "output": "parallelogram",
+    "decision": "diamond",
+    "process": "box",
+    "subroutine": "cds"
+}
+
+FILL_COLORS = {
+    "start": "#A9CCE3",
+    "end": "#A9CCE3",
+    "process": "#D5F5E3",
+    "decision": "#F9E79F",
+    "input": "#E5E5E5",
+    "output": "#E5E5E5",
+    "subroutine": "#D6DBDF"
+}
+
+def canonical_graph(data):
+    """
+    Only what reaches dot: nodes in their original order as (id, label, type),
+    edges in order as (from, to, label) with labels kept on decision edges only.
+    Node order is kept because dot's layout depends on it.
+    """
+    nodes = node_dict(data)
     edges = data.get("edges", [])
 
-    if isinstance(nodes, list):
-        nodes = {n["id"]: {k: v for k, v in n.items() if k != "id"} for n in nodes}
-
     decision_nodes = {nid for nid, node in nodes.items() if node.get("type") == "decision"}
 
-    shape_map = {
-        "start": "oval",
-        "end": "oval",
-        "input": "parallelogram",
-        "output": "parallelogram",
-        "decision": "diamond",
-        "process": "box",
-        "subroutine": "cds"
-    }
-
-    for node_id, info in nodes.items():
-        label = info.get("label", node_id)
-        node_type = info.get("type", "process").lower()
-        shape = shape_map.get(node_type, "box")
-
-        fillcolor = {
-            "start": "#A9CCE3",
-            "end": "#A9CCE3",
-            "process": "#D5F5E3",
-            "decision": "#F9E79F",
-            "input": "#E5E5E5",
-            "output": "#E5E5E5",
-            "subroutine": "#D6DBDF"
-        }.get(node_type, "#FFFFFF")
-
-        dot.node(node_id, label, shape=shape, style="filled", fillcolor=fillcolor)
+    canon_nodes = [
+        [str(node_id), str(info.get("label", node_id)), str(info.get("type", "process")).lower()]
+        for node_id, info in nodes.items()
+    ]
 
+    canon_edges = []
     for edge in edges:
         from_node = edge.get("from") or edge.get("source")
         to_node = edge.get("to") or edge.get("target")
         label = edge.get("label", "")
         if not from_node or not to_node:
             continue
-        if from_node in decision_nodes and label:
+        label = str(label) if from_node in decision_nodes and label else ""
+        canon_edges.append([str(from_node), str(to_node), label])
+
+    return {"nodes": canon_nodes, "edges": canon_edges}
+
+def graph_hash(graph, fmt):
+    """
+    Render cache key: canonical graph + styling + output format. Nodes are
+    sorted here only, so the same graph listed in another order reuses the
+    first drawing of it.
+    """
+    keyed = dict(graph, nodes=sorted(graph["nodes"]))
+    payload = json.dumps([keyed, SHAPE_MAP, FILL_COLORS, fmt, RENDER_CACHE_VERSION], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def graph_limit_error(graph):
+    """Why a graph is refused before rendering, or None"""
+    if len(graph["nodes"]) > FLOWCHART_MAX_NODES:
+        return f"Flowchart has {len(graph['nodes'])} steps; the limit is {FLOWCHART_MAX_NODES}."
+    if len(graph["edges"]) > FLOWCHART_MAX_EDGES:
+        return f"Flowchart has {len(graph['edges'])} connections; the limit is {FLOWCHART_MAX_EDGES}."
+    return None
+
+def is_large_graph(graph):
+    return len(graph["nodes"]) + len(graph["edges"]) > FLOWCHART_LARGE_GRAPH
+
+def dot_command(fmt, output_path):
+    """dot's argv, wrapped in prlimit (CPU seconds, address space) when it is installed"""
+    command = [DOT_BINARY, "-Kdot", f"-T{fmt}", "-o", output_path]
+    if PRLIMIT_BINARY is None:
+        return command
+    return [PRLIMIT_BINARY, f"--cpu={RENDER_TIMEOUT_SECONDS + 1}",
+            f"--as={RENDER_MEMORY_MB * 1024 * 1024}"] + command
+
+def run_dot(source, fmt, output_path):
+    """
+    Run dot on source in a limited child process, writing output_path.
+    At most FLOWCHART_RENDER_WORKERS renders run at once; returns an error
+    message, or None on success.
+    """
+    if not RENDER_SLOTS.acquire(timeout=RENDER_QUEUE_SECONDS):
+        return "Flowchart renderer is busy, please try again."
+    try:
+        with timer("graphviz_render", format=fmt):
+            subprocess.run(
+                dot_command(fmt, output_path),
+                input=source.encode("utf-8"),
+                capture_output=True,
+                timeout=RENDER_TIMEOUT_SECONDS,
+                check=True
+            )
+        return None
+    except subprocess.TimeoutExpired:
+        return f"Flowchart rendering took longer than {RENDER_TIMEOUT_SECONDS}s."
+    except subprocess.CalledProcessError as e:
+        return f"dot failed: {e.stderr.decode(errors='replace').strip()[:500]}"
+    except OSError as e:
+        return f"could not run dot: {e}"
+    finally:
+        RENDER_SLOTS.release()
+
+def build_digraph(graph, fmt="svg"):
+    """graphviz.Digraph for a canonical graph (large graphs get the cheaper layout settings)"""
+    dot = graphviz.Digraph(format=fmt)
+    dot.attr(rankdir='TB')
+    if is_large_graph(graph):
+        dot.attr(splines="line", nslimit="2", nslimit1="2", mclimit="0.5")
+
+    for node_id, label, node_type in graph["nodes"]:
+        shape = SHAPE_MAP.get(node_type, "box")
+        fillcolor = FILL_COLORS.get(node_type, "#FFFFFF")
+        dot.node(node_id, label, shape=shape, style="filled", fillcolor=fillcolor)
+
+    for from_node, to_node, label in graph["edges"]:
+        if label:
             dot.edge(from_node, to_node, label=label)
         else:
             dot.edge(from_node, to_node)
-
-    try:
-        return dot.render(filename=filename_base, cleanup=True)
-    except Exception as e:
-        print("Graphviz Error:", e)
+    return dot
+
+def flowchart_dot_source(data):
+    """DOT source for the browser renderer (client-side mode); no dot process involved"""
+    return build_digraph(canonical_graph(data)).source
+
+def generate_flowchart(data, fmt=None):
+    """
+    Render the flowchart into RENDER_DIR and return its path. Identical graphs
+    share one artifact, so dot only runs for graphs it has not drawn before.
+    Graphs over the node/edge limits are refused; large ones are drawn as SVG
+    with straight edges and capped layout iterations.
+    """
+    fmt = (fmt or FLOWCHART_FORMAT).lower()
+    if fmt not in RENDER_FORMATS:
+        fmt = "jpg"
+
+    graph = canonical_graph(data)
+    limit_error = graph_limit_error(graph)
+    if limit_error:
+        print("Graphviz Error:", limit_error)
+        return None
+    if is_large_graph(graph):
+        fmt = "svg"
+
+    output_path = os.path.join(RENDER_DIR, f"{graph_hash(graph, fmt)}.{fmt}")
+    if os.path.exists(output_path):
+        try:
+            os.utime(output_path)  # recently used: keep it through age-based eviction
+            return output_path
+        except OSError:
+            pass  # evicted just now: draw it again
+
+    dot = build_digraph(graph, fmt)
+
+    # render under a private name, then move into place so readers never see a partial file
+    tmp_path = f"{output_path}.{secrets.token_hex(4)}.tmp"
+    error = run_dot(dot.source, fmt, tmp_path)
+    if error:
+        print("Graphviz Error:", error)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return None
+    os.replace(tmp_path, output_path)
+    return output_path
 
 
 # =========================
-# HISTORY HELPERS
+# PATCH-BASED EDITING
 # =========================
 
-def load_last_flowchart():
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r") as f:
-            return json.load(f)
-    return None
+NODE_TYPES = ("start", "end", "process", "decision", "input", "output", "subroutine")
+# every this many versions the full flowchart is stored next to the delta
+FLOWCHART_SNAPSHOT_EVERY = int(os.getenv("FLOWCHART_SNAPSHOT_EVERY", "20"))
 
-def save_flowchart_history(data):
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+def node_dict(data):
+    """Nodes as {id: {label, type}} (model output sometimes uses a list)"""
+    nodes = data.get("nodes", {})
+    if isinstance(nodes, list):
+        nodes = {n["id"]: {k: v for k, v in n.items() if k != "id"} for n in nodes}
+    return nodes
 
-def save_flowchart_permanently(data, filename_base):
-    with open(f"{filename_base}.json", "w") as f:
-        json.dump(data, f, indent=2)
+def edge_ends(edge):
+    return edge.get("from") or edge.get("source"), edge.get("to") or edge.get("target")
+
+def op_text(op, key, required=False):
+    """op[key] as a string: missing/None is allowed unless required, anything but a string is not"""
+    value = op.get(key)
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{key} is required")
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{key} must be a string, not {type(value).__name__}")
+    return value
+
+def op_node_type(op, key="type"):
+    node_type = op_text(op, key)
+    if node_type is not None and node_type.lower() not in NODE_TYPES:
+        raise ValueError(f"unknown node type {node_type!r} (one of {', '.join(NODE_TYPES)})")
+    return node_type.lower() if node_type else None
+
+def op_endpoint(op, key, nodes, check_nodes):
+    node_id = op_text(op, key, required=True)
+    if check_nodes and node_id not in nodes:
+        raise ValueError(f"no node {node_id!r}")
+    return node_id
+
+def find_edge(edges, op):
+    """Edge position from op["index"], or the first edge matching op["from"] -> op["to"]"""
+    if "index" in op:
+        index = op["index"]
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < len(edges):
+            raise ValueError(f"no edge at index {index!r}")
+        return index
+    frm, to = op_text(op, "from", required=True), op_text(op, "to", required=True)
+    for i, edge in enumerate(edges):
+        if edge_ends(edge) == (frm, to):
+            return i
+    raise ValueError(f"no edge {frm} → {to}")
+
+def apply_patch(data, ops, check_nodes=True):
+    """
+    Apply a batch of edit ops to a flowchart and return the new flowchart
+    (data itself is left untouched). Ops:
+      add_node {id, label, type}     update_node {id, label?, type?}     remove_node {id}
+      add_edge {from, to, label?}    update_edge {index | from+to, new_from?, new_to?, label?}
+      remove_edge {index | from+to}  (from+to removes every such edge, and none is fine)
+    Ids and labels are strings, types are NODE_TYPES and edge ends must be
+    existing nodes (check_nodes=False skips the last two, for replaying
+    edits stored before they were checked).
+    Raises ValueError naming the first op that does not apply.
+    """
+    data = json.loads(json.dumps(data))
+    nodes = node_dict(data)
+    edges = data.get("edges", [])
+
+    for i, op in enumerate(ops):
+        kind = op.get("op") if isinstance(op, dict) else None
+        try:
+            if kind == "add_node":
+                node_id = op_text(op, "id", required=True)
+                if node_id in nodes:
+                    raise ValueError(f"node id {node_id!r} is already used")
+                node_type = op_node_type(op) if check_nodes else op_text(op, "type")
+                nodes[node_id] = {"label": op_text(op, "label") or node_id, "type": node_type or "process"}
+            elif kind == "update_node":
+                node_id = op_text(op, "id", required=True)
+                node = nodes.get(node_id)
+                if node is None:
+                    raise ValueError(f"no node {node_id!r}")
+                label = op_text(op, "label")
+                node_type = op_node_type(op) if check_nodes else op_text(op, "type")
+                if label:
+                    node["label"] = label
+                if node_type:
+                    node["type"] = node_type
+            elif kind == "remove_node":
+                node_id = op_text(op, "id", required=True)
+                if nodes.pop(node_id, None) is None:
+                    raise ValueError(f"no node {node_id!r}")
+                edges = [e for e in edges if node_id not in edge_ends(e)]
+            elif kind == "add_edge":
+                edge = {"from": op_endpoint(op, "from", nodes, check_nodes),
+                        "to": op_endpoint(op, "to", nodes, check_nodes)}
+                label = op_text(op, "label")
+                if label:
+                    edge["label"] = label
+                edges.append(edge)
+            elif kind == "update_edge":
+                edge = edges[find_edge(edges, op)]
+                new_from = op_endpoint(op, "new_from", nodes, check_nodes) if op.get("new_from") else None
+                new_to = op_endpoint(op, "new_to", nodes, check_nodes) if op.get("new_to") else None
+                label = op_text(op, "label")
+                if new_from:
+                    edge.pop("source", None)
+                    edge["from"] = new_from
+                if new_to:
+                    edge.pop("target", None)
+                    edge["to"] = new_to
+                if "label" in op:
+                    if label:
+                        edge["label"] = label
+                    else:
+                        edge.pop("label", None)
+            elif kind == "remove_edge":
+                if "index" in op:
+                    edges.pop(find_edge(edges, op))
+                else:
+                    ends = (op_text(op, "from", required=True), op_text(op, "to", required=True))
+                    edges = [e for e in edges if edge_ends(e) != ends]
+            else:
+                raise ValueError(f"unknown op {kind!r}")
+        except ValueError as e:
+            raise ValueError(f"edit {i + 1} ({kind}): {e}")
+
+    data["nodes"] = nodes
+    data["edges"] = edges
+    return data
+
+def load_session_graph(item):
+    """
+    Current state of a history session: (flowchart, version, image_file).
+    Starts from the latest snapshot (or the original JSON) and replays only
+    the edits stored after it, at most FLOWCHART_SNAPSHOT_EVERY - 1.
+    """
+    snapshot = latest_snapshot(item["id"])
+    if snapshot:
+        data, version, image_file = snapshot["flowchart"], snapshot["version"], snapshot["image_file"]
+    else:
+        with open(item["json_file"], "r") as f:
+            data = json.load(f)
+        version, image_file = 0, item["image_file"]
+    for edit in list_edits(item["id"], after_version=version):
+        data = apply_patch(data, edit["ops"], check_nodes=False)
+        version, image_file = edit["version"], edit["image_file"]
+    return data, version, image_file
+
+def load_session_state(item):
+    data, version, image_file = load_session_graph(item)
+    return {"version": version, "flowchart": data, "image_file": image_file}
+
+def patch_session(item, base_version, ops, fmt=None, render=True):
+    """
+    Apply one batch of ops to a history session that is at base_version,
+    render once (skipped with render=False, for client-side rendering) and
+    store the batch as the next version.
+    Returns (state, error); on a version conflict state is the current one.
+    """
+    state = load_session_state(item)
+    data, version, image_file = state["flowchart"], state["version"], state["image_file"]
+    if base_version != version:
+        return state, f"Flowchart is at version {version}, not {base_version}; reload and retry."
+    if not ops:
+        return state, None
+
+    try:
+        new_data = apply_patch(data, ops)
+    except ValueError as e:
+        return None, str(e)
+
+    limit_error = graph_limit_error(canonical_graph(new_data))
+    if limit_error:
+        return None, limit_error
+    new_image = ""
+    if render:
+        new_image = generate_flowchart(new_data, fmt or os.path.splitext(image_file)[1].lstrip("."))
+        if not new_image:
+            return None, "Failed to generate flowchart image."
+
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    snapshot = new_data if (version + 1) % FLOWCHART_SNAPSHOT_EVERY == 0 else None
+    if not add_edit(item["id"], version + 1, ops, new_image, timestamp, snapshot):
+        # another batch was stored first
+        return load_session_state(item), "Flowchart changed while saving; reload and retry."
+    return {"version": version + 1, "flowchart": new_data, "image_file": new_image}, None
 
 # =========================
-# MAIN PROCESSING FUNCTION
+# HISTORY HELPERS
 # =========================
 
-def process_user_input(user_query: str):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename_base = os.path.join(FLOWCHART_DIR, f"flowchart_{timestamp}")
+def save_flowchart_permanently(data, filename_base):
+    write_json_atomic(f"{filename_base}.json", data)
 
-    last_flowchart = load_last_flowchart()
+# =========================
+# PROMPT CACHE
+# =========================
 
-    # NEW FLOWCHART PROMPT
-    prompt = f"""
+# NEW FLOWCHART PROMPT
+FLOWCHART_PROMPT = """
 Create a flowchart JSON for this process:
 "{user_query}"
 """
-
-    haiku_text = call_haiku(prompt)
+PROMPT_CACHE_DIR = "cache/flowchart_prompts"
+PROMPT_CACHE_MAX_AGE = int(os.getenv("FLOWCHART_PROMPT_CACHE_HOURS", "168")) * 3600
+# one Bedrock call per distinct prompt at a time; identical requests wait for it
+INFLIGHT = {}
+INFLIGHT_LOCK = threading.Lock()
+
+def normalize_prompt(text):
+    """Case, spacing and trailing punctuation don't change the flowchart asked for"""
+    return " ".join(text.casefold().split()).rstrip(" .!?")
+
+def prompt_cache_key(user_query):
+    return cache_key(FLOWCHART_MODEL_ID, FLOWCHART_PROMPT, normalize_prompt(user_query))
+
+def ask_model_for_flowchart(user_query, stream=None):
+    seen = [(0, 0)]
+
+    def report(text):
+        # progress events only when the node/edge count moved
+        counts = partial_flowchart_counts(text)
+        if counts != seen[0]:
+            seen[0] = counts
+            stream.progress({"nodes": counts[0], "edges": counts[1]})
+
+    haiku_text = call_haiku(FLOWCHART_PROMPT.format(user_query=user_query), report if stream else None)
     if not haiku_text:
-        return None, None, "Model returned no response."
+        return None, "Model returned no response."
 
     data = parse_haiku_output(haiku_text)
     if not data:
-        return None, None, "Failed to parse model response."
+        return None, "Failed to parse model response."
+    return data, None
+
+def flowchart_for_prompt(user_query, stream=None):
+    """
+    Parsed flowchart JSON for a prompt: from the prompt cache, from an
+    identical request already in flight, or from a new model call.
+    Returns (data, error); only successful results are cached.
+    """
+    key = prompt_cache_key(user_query)
+    cached = load_cached(PROMPT_CACHE_DIR, key)
+    if cached and time.time() - cached["created"] <= PROMPT_CACHE_MAX_AGE:
+        return cached["flowchart"], None
+
+    with INFLIGHT_LOCK:
+        future = INFLIGHT.get(key)
+        owner = future is None
+        if owner:
+            future = INFLIGHT[key] = Future()
+    if not owner:
+        # the owner's call ends within FLOWCHART_MODEL_TIMEOUT plus one stalled read
+        try:
+            return future.result(timeout=FLOWCHART_MODEL_TIMEOUT + BEDROCK_READ_TIMEOUT)
+        except FutureTimeoutError:
+            return None, "Flowchart generation timed out."
+
+    # whatever ends the owner's call (including SystemExit from a worker
+    # timeout or shutdown) must release the waiters
+    result = None, "Flowchart generation was interrupted."
+    try:
+        result = ask_model_for_flowchart(user_query, stream)
+        if result[0] is not None:
+            store_cached(PROMPT_CACHE_DIR, key, {"flowchart": result[0], "created": time.time()})
+    except Exception as e:
+        result = None, f"Flowchart generation failed: {e}"
+    finally:
+        with INFLIGHT_LOCK:
+            INFLIGHT.pop(key, None)
+        future.set_result(result)
+    return result
+
+
+# =========================
+# MAIN PROCESSING FUNCTION
+# =========================
+
+def process_user_input(user_query: str, owner="", fmt=None, render=True, stream=None):
+    """
+    Generate a flowchart for user_query and save it as a history session.
+    Returns (image_path, history entry, error); with render=False (client-side
+    rendering) no image is drawn and image_path is "". With a TextStream,
+    node/edge counts are reported while the model response arrives.
+    """
+    # unique per request: concurrent generations never share a file
+    filename_base = os.path.join(FLOWCHART_DIR, unique_name("flowchart"))
+
+    data, error = flowchart_for_prompt(user_query, stream)
+    if error:
+        return None, None, error
 
-    save_flowchart_history(data)
     save_flowchart_permanently(data, filename_base)
 
-    image_path = generate_flowchart(data, filename_base)
-    if not image_path:
-        return None, None, "Failed to generate flowchart image."
+    limit_error = graph_limit_error(canonical_graph(data))
+    if limit_error:
+        return None, None, limit_error
+
+    image_path = ""
+    if render:
+        image_path = generate_flowchart(data, fmt)
+        if not image_path:
+            return None, None, "Failed to generate flowchart image."
 
     # SAVE SESSION HISTORY (NEW)
-    save_full_session(user_query, data, image_path)
+    entry = save_full_session(user_query, data, image_path, owner)
 
-    return image_path, f"{filename_base}.json", None
+    return image_path, entry, None
@@ -0,0 +1,184 @@
+# modules/gantt_analytics.py
+# Schedule statistics computed locally so the AI summary only needs a short digest.
+import numpy as np
+import pandas as pd
+
+# how many items any list in the digest may hold (keeps the prompt bounded)
+DIGEST_LIST_LIMIT = 5
+DIGEST_NAME_CHARS = 60
+# longest-task threshold used by the summary ("duration > 10 days")
+LONG_TASK_DAYS = 10
+
+DAY = np.timedelta64(1, "D")
+
+
+def short_name(value):
+    name = str(value)
+    return name if len(name) <= DIGEST_NAME_CHARS else name[:DIGEST_NAME_CHARS - 3] + "..."
+
+
+def concurrency_profile(starts, ends):
+    """
+    Sweep-line over inclusive [start, end] day intervals (datetime64[D] arrays).
+    Returns (change_days, active): the number of tasks active from
+    change_days[i] up to the day before change_days[i + 1].
+    """
+    days = np.concatenate([starts, ends + DAY])
+    deltas = np.concatenate([np.ones(len(starts), dtype=np.int64), -np.ones(len(ends), dtype=np.int64)])
+    order = np.argsort(days, kind="stable")
+    change_days, first = np.unique(days[order], return_index=True)
+    active = np.add.reduceat(deltas[order], first).cumsum()
+    return change_days, active
+
+
+def overlap_counts(starts, ends):
+    """For every task, how many other tasks share at least one day with it."""
+    sorted_starts = np.sort(starts)
+    sorted_ends = np.sort(ends)
+    # tasks starting on/before my end, minus tasks that ended before my start, minus myself
+    return (np.searchsorted(sorted_starts, ends, side="right")
+            - np.searchsorted(sorted_ends, starts, side="left") - 1)
+
+
+def span_chain(starts, ends):
+    """
+    Critical-path-style walk across the project span: starting at the project
+    start, repeatedly take the task (already started) that reaches furthest,
+    jumping over idle gaps. Returns (chain task positions, list of gaps as
+    (first idle day, last idle day)). Loops once per chain link, not per task.
+    """
+    order = np.argsort(starts, kind="stable")
+    s, e = starts[order], ends[order]
+    # position (in start order) of the furthest-reaching task among the first k+1
+    reach = np.maximum.accumulate(e)
+    best = np.zeros(len(e), dtype=np.int64)
+    best[1:] = np.where(e[1:] > reach[:-1], np.arange(1, len(e)), 0)
+    best = np.maximum.accumulate(best)
+
+    chain, gaps = [], []
+    covered_to = s[0] - DAY
+    while covered_to < reach[-1]:
+        k = np.searchsorted(s, covered_to + DAY, side="right") - 1
+        if k < 0 or e[best[k]] <= covered_to:
+            # nothing running on the next day: idle until the next task starts
+            next_start = s[np.searchsorted(s, covered_to + DAY, side="right")]
+            gaps.append((covered_to + DAY, next_start - DAY))
+            covered_to = next_start - DAY
+            continue
+        chain.append(int(order[best[k]]))
+        covered_to = e[best[k]]
+    return chain, gaps
+
+
+def analyze_schedule(df, open_tasks=(), calendar=None):
+    """
+    Compute the schedule figures the AI summary asks about from the typed
+    task list (Task, Start Date, End Date, Duration (Days)):
+    timeline, milestones, longest tasks, overlap/parallelism, span chain and
+    idle gaps, open-ended tasks. Every list is capped at DIGEST_LIST_LIMIT.
+    With a np.busdaycalendar the timeline also gets its working-day count.
+    """
+    df = df[df["Start Date"].notna() & df["End Date"].notna()]
+    if df.empty:
+        return {"tasks": 0}
+
+    starts = df["Start Date"].to_numpy(dtype="datetime64[D]")
+    ends = np.maximum(df["End Date"].to_numpy(dtype="datetime64[D]"), starts)
+    names = df["Task"].to_numpy()
+    durations = df["Duration (Days)"].to_numpy()
+    limit = DIGEST_LIST_LIMIT
+
+    project_start, project_end = starts.min(), ends.max()
+    span_days = int((project_end - project_start) / DAY) + 1
+    working_span = None
+    if calendar is not None:
+        working_span = int(np.busday_count(project_start, project_end + DAY, busdaycal=calendar))
+
+    change_days, active = concurrency_profile(starts, ends)
+    peak = int(active.max())
+    peak_at = np.flatnonzero(active == peak)
+    peak_windows = [(change_days[i], change_days[i + 1] - DAY) for i in peak_at[:limit]]
+    busy_days = int(((change_days[1:] - change_days[:-1]) / DAY)[active[:-1] > 0].sum())
+
+    overlaps = overlap_counts(starts, ends)
+    most_overlapping = np.argsort(-overlaps, kind="stable")[:limit]
+    # pairs sharing a day: every task counted from both sides
+    overlapping_pairs = int(overlaps.sum()) // 2
+
+    longest = np.argsort(-durations, kind="stable")[:3]
+    chain, gaps = span_chain(starts, ends)
+
+    return {
+        "tasks": len(df),
+        "project_start": project_start,
+        "project_end": project_end,
+        "span_days": span_days,
+        "working_span_days": working_span,
+        "total_task_days": int(durations.sum()),
+        "earliest_tasks": [short_name(n) for n in names[starts == project_start][:limit]],
+        "latest_tasks": [short_name(n) for n in names[ends == project_end][:limit]],
+        "longest_tasks": [(short_name(names[i]), int(durations[i])) for i in longest if durations[i] > LONG_TASK_DAYS],
+        "peak_parallel": peak,
+        "peak_windows": peak_windows,
+        "average_parallel": round(float((ends - starts + DAY).sum() / DAY) / max(busy_days, 1), 2),
+        "overlapping_pairs": overlapping_pairs,
+        "tasks_without_overlap": int((overlaps == 0).sum()),
+        "most_overlapping": [(short_name(names[i]), int(overlaps[i])) for i in most_overlapping if overlaps[i] > 0],
+        "span_chain": [short_name(names[i]) for i in chain[:limit]],
+        "span_chain_length": len(chain),
+        "idle_gaps": gaps[:limit],
+        "idle_gap_count": len(gaps),
+        "open_tasks": [short_name(n) for n in list(open_tasks)[:limit]],
+        "open_task_count": len(open_tasks),
+    }
+
+
+def fmt_day(day):
+    return str(np.datetime64(day, "D"))
+
+
+def more(shown, total):
+    return f" (+{total - shown} more)" if total > shown else ""
+
+
+def schedule_digest(stats):
+    """Render analyze_schedule output as the compact text block sent to the model."""
+    if not stats.get("tasks"):
+        return "No tasks with valid dates."
+
+    working = ""
+    if stats.get("working_span_days") is not None:
+        working = f", {stats['working_span_days']} working days"
+    lines = [
+        f"Tasks: {stats['tasks']}",
+        f"Timeline: {fmt_day(stats['project_start'])} to {fmt_day(stats['project_end'])} "
+        f"({stats['span_days']} calendar days{working}, {stats['total_task_days']} working task-days in total)",
+        "Earliest start: " + ", ".join(stats["earliest_tasks"]),
+        "Latest finish: " + ", ".join(stats["latest_tasks"]),
+    ]
+    if stats["longest_tasks"]:
+        lines.append("Longest tasks: " + "; ".join(f"{n} ({d} working days)" for n, d in stats["longest_tasks"]))
+    else:
+        lines.append(f"Longest tasks: none longer than {LONG_TASK_DAYS} days")
+
+    windows = "; ".join(f"{fmt_day(a)} to {fmt_day(b)}" for a, b in stats["peak_windows"])
+    lines.append(f"Peak parallelism: {stats['peak_parallel']} tasks at once ({windows})")
+    lines.append(f"Average parallelism on working stretches: {stats['average_parallel']}")
+    lines.append(f"Overlapping task pairs: {stats['overlapping_pairs']}; "
+                 f"tasks overlapping nothing: {stats['tasks_without_overlap']}")
+    if stats["most_overlapping"]:
+        lines.append("Most overlapped tasks: " + "; ".join(f"{n} (with {c} others)" for n, c in stats["most_overlapping"]))
+
+    lines.append("Span-defining chain: " + " -> ".join(stats["span_chain"])
+                 + more(len(stats["span_chain"]), stats["span_chain_length"]))
+    if stats["idle_gaps"]:
+        lines.append("Idle gaps (no task running): "
+                     + "; ".join(f"{fmt_day(a)} to {fmt_day(b)}" for a, b in stats["idle_gaps"])
+                     + more(len(stats["idle_gaps"]), stats["idle_gap_count"]))
+    else:
+        lines.append("Idle gaps (no task running): none")
+
+    if stats["open_tasks"]:
+        lines.append("Open-ended tasks (no End Date, plotted to today): " + ", ".join(stats["open_tasks"])
+                     + more(len(stats["open_tasks"]), stats["open_task_count"]))
+    return "\n".join(lines)
@@ -1,37 +1,150 @@
 # modules/ganttchart.py
 import pandas as pd
+import numpy as np
 import os
+import re
 from datetime import datetime
+from collections import Counter
 import json
+import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from difflib import SequenceMatcher
 from dateutil import parser
-import boto3
-
-# keep your call_haiku function (unchanged)
-def call_haiku(prompt):
-    bedrock = boto3.client(
-        service_name='bedrock-runtime',
-        region_name='ap-south-1'
-    )
-
-    body = json.dumps({
-        "anthropic_version": "bedrock-2023-05-31",
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 1000,
-        "temperature": 0.5,
-        "top_p": 0.9,
-    })
-
-    response = bedrock.invoke_model(
-        modelId='anthropic.claude-3-haiku-20240307-v1:0',
-        body=body,
-        contentType='application/json'
-    )
+from openpyxl import load_workbook
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from modules.gantt_analytics import analyze_schedule, schedule_digest
+from modules.sheet_reader import read_columns
+from modules.bedrock_stream import model_text, new_stream, get_stream
+from modules.metrics import timer
+
+# preview rendering: tasks per page, detail pages rendered after the overview
+PREVIEW_PAGE_SIZE = int(os.getenv("GANTT_PREVIEW_PAGE_SIZE", "50"))
+PREVIEW_MAX_PAGES = int(os.getenv("GANTT_PREVIEW_MAX_PAGES", "5"))
+PREVIEW_LABEL_CHARS = 40
+PREVIEW_LABEL_INCHES = 3.2
+PREVIEW_WIDTH = 14
+PREVIEW_FORMATS = ("png", "svg")
+
+# Excel grid: bucket size chosen from the horizon, width capped
+GRID_GRANULARITIES = ("day", "week", "month")
+GRID_AUTO_DAY_MAX_DAYS = 120
+GRID_AUTO_WEEK_MAX_DAYS = 730
+GRID_MAX_COLUMNS = 1000
+GRID_FILL_COLOR = "#4F81BD"
+GRID_PARTIAL_COLOR = "#B8CCE4"
+
+def call_haiku(prompt, stream=None):
+    """Haiku completion, streamed; text is forwarded to stream as it arrives"""
+    return model_text(prompt, stream=stream, stage="gantt_summary", max_tokens=1000, temperature=0.5, top_p=0.9).strip()
+
+
+# part of the result cache key: bump when the Excel or preview output changes
+GANTT_GENERATOR_VERSION = "6"
+
+SUMMARY_PENDING = "(AI summary is being generated...)"
+SUMMARY_FAILED_PREFIX = "(AI summary failed"
+# background Haiku calls: the chart and Excel are returned without waiting for them
+SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("GANTT_SUMMARY_WORKERS", "4")))
+SUMMARY_JOBS = {}
+SUMMARY_JOBS_LOCK = threading.Lock()
+SUMMARY_JOB_LIMIT = 500
+
+
+def start_summary_job(prompt):
+    """
+    Start the Haiku summary in the background and return its job id.
+    The job record also carries the workbook hand-off: finish_summary_job()
+    tells it where the Excel was written and whether the summary made it in.
+    """
+    # the job id doubles as the /stream/<id> id the page follows
+    job_id, stream = new_stream()
+    job = {"stream": stream, "summary_ready": threading.Event(), "workbook_ready": threading.Event(), "excel": None, "inline": False}
+    with SUMMARY_JOBS_LOCK:
+        SUMMARY_JOBS[job_id] = job
+        # forget the oldest jobs (dicts keep insertion order)
+        while len(SUMMARY_JOBS) > SUMMARY_JOB_LIMIT:
+            SUMMARY_JOBS.pop(next(iter(SUMMARY_JOBS)))
+    SUMMARY_EXECUTOR.submit(run_summary_job, prompt, job)
+    return job_id
+
+
+def run_summary_job(prompt, job):
+    try:
+        summary = call_haiku(prompt, job["stream"])
+        job["stream"].finish({"summary": summary})
+    except Exception as e:
+        # don't fail entire processing if AI call fails — provide fallback text
+        summary = f"{SUMMARY_FAILED_PREFIX}: {e})"
+        job["stream"].fail(summary)
+    with SUMMARY_JOBS_LOCK:
+        job["summary"] = summary
+        job["summary_ready"].set()
+        callbacks = job.pop("callbacks", [])
+    for callback in callbacks:
+        try:
+            callback(summary)
+        except Exception as e:
+            print(f"AI summary callback failed: {e}")
 
-    response_body = json.loads(response['body'].read())
-    return response_body['content'][0]['text'].strip()
+    # the Excel may still be being written; patch its summary sheet once it is closed
+    job["workbook_ready"].wait()
+    if job["excel"] and not job["inline"]:
+        try:
+            write_summary_to_excel(job["excel"], summary)
+        except Exception as e:
+            print(f"Could not write AI summary into {job['excel']}: {e}")
+    return summary
+
+
+def finish_summary_job(job_id, output_excel, inline):
+    """Called once the workbook is closed (output_excel=None if writing failed)."""
+    job = SUMMARY_JOBS.get(job_id)
+    if job:
+        job["excel"] = output_excel
+        job["inline"] = inline
+        job["workbook_ready"].set()
+
+
+def on_summary(job_id, callback):
+    """Call callback(summary) once the job's summary is ready (right away if it already is)."""
+    job = SUMMARY_JOBS.get(job_id)
+    if job is None:
+        return False
+    with SUMMARY_JOBS_LOCK:
+        if not job["summary_ready"].is_set():
+            job.setdefault("callbacks", []).append(callback)
+            return True
+    callback(job["summary"])
+    return True
+
+
+def get_summary(job_id, timeout=None):
+    """
+    Summary text for a job, or None while Haiku is still running (waits up
+    to timeout seconds if given). The Excel copy is patched a moment later.
+    Raises KeyError for unknown/expired job ids.
+    """
+    job = SUMMARY_JOBS.get(job_id)
+    if job is None:
+        # started by another worker process: read the outcome from its stream log
+        stream = get_stream(job_id)
+        if stream is None:
+            raise KeyError(job_id)
+        outcome = stream.outcome()
+        return outcome and outcome[1].get("summary", outcome[1].get("error"))
+    job["summary_ready"].wait(timeout)
+    return job.get("summary")
+
+
+def write_summary_to_excel(output_excel, summary):
+    """Replace the pending text in the "AI Summary" sheet; the file is swapped atomically."""
+    wb = load_workbook(output_excel)
+    wb["AI Summary"]["A3"] = summary
+    tmp_path = f"{output_excel}.tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, output_excel)
 
 
 def fuzzy_find_column(df_columns, expected_names):
@@ -64,6 +177,49 @@ def fuzzy_find_column(df_columns, expected_names):
     return None
 
 
+TASK_COLUMN_NAMES = [
+    "task","activity","activities","work","job","item","milestone","phase","title","task name","activity name",
+    "description","summary"
+]
+START_COLUMN_NAMES = [
+    "start","start date","begin","from","launch","kickoff","starting","startday","planned start",
+    "date start","begins","starting date"
+]
+END_COLUMN_NAMES = [
+    "end","end date","finish","to","deadline","completion","close","closing","planned end",
+    "enddate","finish date","ending","ending date"
+]
+
+
+def detect_schedule_columns(columns):
+    """(task, start, end) column labels found in a header, or None if any is missing."""
+    task_col = fuzzy_find_column(columns, TASK_COLUMN_NAMES)
+    start_col = fuzzy_find_column(columns, START_COLUMN_NAMES)
+    end_col = fuzzy_find_column(columns, END_COLUMN_NAMES)
+    if not task_col or not start_col or not end_col:
+        return None
+    return task_col, start_col, end_col
+
+
+# formats tried in order by smart_date_parse; the first one that matches wins
+DATE_FORMATS = [
+    "%Y-%m-%d", "%d-%m-%Y", "%m-%d-%Y",
+    "%d/%m/%Y", "%m/%d/%Y", "%Y/%m/%d",
+    "%d.%m.%Y", "%Y.%m.%d",
+    "%d %b %Y", "%d %B %Y", "%b %d %Y", "%B %d %Y",
+    "%Y%m%d", "%d%m%Y"
+]
+
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+# Excel serials whose date fits in datetime64[ns]
+EXCEL_SERIAL_MIN = (pd.Timestamp.min.ceil('D').to_pydatetime() - EXCEL_EPOCH.to_pydatetime()).days
+EXCEL_SERIAL_MAX = (pd.Timestamp.max.floor('D').to_pydatetime() - EXCEL_EPOCH.to_pydatetime()).days
+
+DATE_SAMPLE_SIZE = 200
+# a format can only match strings containing its separator ('-', '/', '.')
+FORMAT_SEPARATORS = {fmt: re.sub(r"%.|\s", "", fmt)[:1] for fmt in DATE_FORMATS}
+
+
 def smart_date_parse(value):
     """Parses nearly ANY date format including Excel serials."""
     if pd.isna(value):
@@ -72,7 +228,7 @@ def smart_date_parse(value):
     # Excel serial number (float/int)
     if isinstance(value, (int, float)):
         try:
-            return pd.Timestamp('1899-12-30') + pd.to_timedelta(int(value), unit='D')
+            return EXCEL_EPOCH + pd.to_timedelta(int(value), unit='D')
         except:
             pass
 
@@ -81,15 +237,7 @@ def smart_date_parse(value):
         return pd.NaT
 
     # try multiple formats
-    formats = [
-        "%Y-%m-%d", "%d-%m-%Y", "%m-%d-%Y",
-        "%d/%m/%Y", "%m/%d/%Y", "%Y/%m/%d",
-        "%d.%m.%Y", "%Y.%m.%d",
-        "%d %b %Y", "%d %B %Y", "%b %d %Y", "%B %d %Y",
-        "%Y%m%d", "%d%m%Y"
-    ]
-
-    for fmt in formats:
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(s, fmt)
         except:
@@ -105,42 +253,453 @@ def smart_date_parse(value):
             return pd.NaT
 
 
+def infer_date_format(strings, sample_size=DATE_SAMPLE_SIZE):
+    """Most common first-matching DATE_FORMATS entry in an evenly spaced sample of strings."""
+    step = max(1, len(strings) // sample_size)
+    counts = Counter()
+    for s in strings[::step][:sample_size]:
+        for fmt in DATE_FORMATS:
+            try:
+                datetime.strptime(s, fmt)
+            except ValueError:
+                continue
+            counts[fmt] += 1
+            break
+    return counts.most_common(1)[0][0] if counts else None
+
 
-def generate_gantt_chart(excel_path, include_saturday=True, include_sunday=True):
+def join_indexes(indexes):
+    """One integer index from a list of (possibly empty) position indexes."""
+    # Index.append warns about empty object-dtype entries on pandas 2.x
+    return pd.Index(np.concatenate([np.asarray(ix, dtype=np.int64) for ix in indexes]))
+
+
+def strptime_out_of_range(strings, fmt):
     """
-    Reads excel_path, detects Task/Start/End columns flexibly, parses dates,
-    writes a Gantt excel and returns (output_excel_path, meta_dict).
-    meta_dict contains keys: open_tasks (list), project_start, project_end
+    Index of the strings pd.to_datetime rejected for fmt but strptime reads
+    as a year outside datetime64[ns] (e.g. "1151715" as %Y%m%d -> 1151-07-15).
+    They must not fall through to a later format.
     """
-    # read
-    df = pd.read_excel(excel_path, engine='openpyxl')
+    year = pd.to_numeric(strings.str[:4], errors="coerce")
+    suspects = strings[(year <= pd.Timestamp.min.year) | (year >= pd.Timestamp.max.year)]
+    suspects = suspects[pd.to_datetime("2000" + suspects.str[4:], format=fmt, errors="coerce").notna()]
+    found = []
+    for idx, s in suspects.items():
+        try:
+            datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+        found.append(idx)
+    return pd.Index(found, dtype=np.int64)
 
-    # detect columns
-    task_col = fuzzy_find_column(df.columns, [
-    "task","activity","activities","work","job","item","milestone","phase","title","task name","activity name",
-    "description","summary"
-    ])
 
-    start_col = fuzzy_find_column(df.columns, [
-    "start","start date","begin","from","launch","kickoff","starting","startday","planned start",
-    "date start","begins","starting date"
-    ])
+def parse_with_formats(strings, formats):
+    """
+    First-match parsing of a string Series with one vectorized pd.to_datetime
+    call per format, each one only over the strings still unparsed.
+    Returns (parsed datetime64 Series, index of unmatched strings, index of
+    strings strptime would read as a year outside the datetime64 range).
+    """
+    parsed = pd.Series(pd.NaT, index=strings.index, dtype="datetime64[ns]")
+    remaining = strings
+    out_of_range = []
+    for fmt in formats:
+        if remaining.empty:
+            break
+        separator = FORMAT_SEPARATORS.get(fmt)
+        candidates = remaining[remaining.str.contains(separator, regex=False)] if separator else remaining
+        attempt = pd.to_datetime(candidates, format=fmt, errors="coerce").dropna()
+        parsed[attempt.index] = attempt
+        remaining = remaining.drop(attempt.index)
+        if fmt.startswith("%Y") and not remaining.empty:
+            found = strptime_out_of_range(remaining, fmt)
+            out_of_range.append(found)
+            remaining = remaining.drop(found)
+    return parsed, remaining.index, join_indexes(out_of_range or [[]])
+
+
+def parse_date_strings(strings):
+    """
+    First-match DATE_FORMATS parsing of stripped, non-empty strings.
+    Returns (parsed datetime64 Series, index of strings left for smart_date_parse).
+
+    The dominant format (inferred from a sample) is applied to every row in
+    one call. Rows it matched are re-checked against the formats before it,
+    since an earlier match wins (05/01/2024 is %d/%m/%Y even in a %m/%d/%Y
+    column), and rows it missed go through the other formats in order. Each
+    row thus gets the format smart_date_parse would have picked.
+    """
+    dominant = infer_date_format(strings.tolist())
+    if dominant is None:
+        parsed, unmatched, out_of_range = parse_with_formats(strings, DATE_FORMATS)
+        return parsed, join_indexes([unmatched, out_of_range])
+    position = DATE_FORMATS.index(dominant)
+    earlier_formats = DATE_FORMATS[:position]
+
+    parsed, unmatched, out_of_range = parse_with_formats(strings, [dominant])
+    fallback = [out_of_range]
+
+    earlier, _, out_of_range = parse_with_formats(strings[parsed.dropna().index], earlier_formats)
+    earlier = earlier.dropna()
+    parsed[earlier.index] = earlier
+    parsed[out_of_range] = pd.NaT
+    fallback.append(out_of_range)
+
+    rest, unmatched, out_of_range = parse_with_formats(strings[unmatched], earlier_formats + DATE_FORMATS[position + 1:])
+    rest = rest.dropna()
+    parsed[rest.index] = rest
+    fallback.extend([unmatched, out_of_range])
+    return parsed, join_indexes(fallback)
+
+
+def parse_date_column(column):
+    """
+    Column-wise equivalent of column.apply(smart_date_parse):
+      - Excel serials are converted with one vectorized timedelta addition
+      - datetime cells are converted in one call
+      - strings go through parse_date_strings (one pd.to_datetime call per
+        format actually present in the column)
+      - only what is still unparsed (free text, out-of-range dates) goes
+        through smart_date_parse cell by cell
+    benchmarks/date_parse_benchmark.py checks it against smart_date_parse.
+    """
+    if pd.api.types.is_datetime64_dtype(column):
+        # smart_date_parse goes via str() and dateutil, which keeps microseconds
+        return column.dt.floor("us").astype("datetime64[ns]")
+
+    values = column.reset_index(drop=True)
+    result = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    fallback = []  # positions left for smart_date_parse
+
+    is_null = values.isna()
+    kinds = values.map(type)
+    numeric_types = [t for t in kinds.unique() if issubclass(t, (int, float))]
+    datetime_types = [t for t in kinds.unique() if issubclass(t, datetime)]
+    is_numeric = kinds.isin(numeric_types) & ~is_null
+    is_datetime = kinds.isin(datetime_types) & ~is_null
+
+    # Excel serial numbers
+    days = np.trunc(values[is_numeric].astype("float64"))
+    in_range = days.between(EXCEL_SERIAL_MIN, EXCEL_SERIAL_MAX)
+    result[in_range[in_range].index] = EXCEL_EPOCH + pd.to_timedelta(days[in_range], unit="D")
+    fallback.append(in_range[~in_range].index)
+
+    # datetime cells (openpyxl mixes them with strings in object columns)
+    if is_datetime.any():
+        try:
+            stamps = pd.to_datetime(values[is_datetime])
+        except (ValueError, TypeError):
+            stamps = None
+        if stamps is not None and pd.api.types.is_datetime64_dtype(stamps):
+            result[stamps.index] = stamps.dt.floor("us")
+        else:
+            fallback.append(is_datetime[is_datetime].index)
+
+    # strings
+    strings = values[~(is_null | is_numeric | is_datetime)].astype(str).str.strip()
+    strings = strings[strings != ""]
+    parsed, unparsed = parse_date_strings(strings)
+    parsed = parsed.dropna()
+    result[parsed.index] = parsed
+    fallback.append(unparsed)
+
+    # per-cell fallback for whatever is left
+    fallback = join_indexes(fallback)
+    if len(fallback):
+        cells = pd.Series([smart_date_parse(values[i]) for i in fallback], index=fallback)
+        if not pd.api.types.is_datetime64_dtype(cells):
+            # tz-aware or out-of-range results: keep exactly what apply() gives
+            return column.apply(smart_date_parse)
+        result[fallback] = cells
+
+    return pd.Series(result.to_numpy(), index=column.index, name=column.name)
+
+
+def work_calendar(include_saturday=True, include_sunday=True, holidays=None):
+    """NumPy business-day calendar: Mon-Fri always, weekends per the options, minus holidays."""
+    weekmask = [1, 1, 1, 1, 1, int(include_saturday), int(include_sunday)]
+    holidays = np.asarray([] if holidays is None else holidays, dtype="datetime64[D]")
+    return np.busdaycalendar(weekmask=weekmask, holidays=holidays[~np.isnat(holidays)])
+
+
+def working_days(starts, ends, calendar):
+    """Working days in each inclusive [start, end] range, for whole columns at once."""
+    starts = starts.to_numpy(dtype="datetime64[D]")
+    ends = ends.to_numpy(dtype="datetime64[D]")
+    return np.busday_count(starts, ends + np.timedelta64(1, "D"), busdaycal=calendar)
+
+
+def load_holidays(path):
+    """
+    Read a holiday list (.xlsx/.xls/.csv, or plain text with one date per
+    line). Uses the column with the most parseable dates; header rows and
+    blanks are skipped. Returns sorted unique datetime64[D] values.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xlsx", ".xls"):
+        table = pd.read_excel(path, header=None)
+    else:
+        table = pd.read_csv(path, header=None, dtype=str, skipinitialspace=True)
+
+    best = pd.Series(dtype="datetime64[ns]")
+    for col in table.columns:
+        parsed = parse_date_column(table[col]).dropna()
+        if len(parsed) > len(best):
+            best = parsed
+    if best.empty:
+        raise ValueError("No dates found in the holiday list.")
+    return np.unique(best.to_numpy(dtype="datetime64[D]"))
+
+
+def choose_granularity(project_start, project_end, requested="auto", calendar=None):
+    """
+    Grid bucket size: day / week / month, picked from the project horizon for
+    "auto". A requested size that would exceed GRID_MAX_COLUMNS columns is
+    coarsened so the sheet stays bounded.
+    """
+    span_days = (project_end - project_start).days + 1
+    if requested not in GRID_GRANULARITIES:
+        if span_days <= GRID_AUTO_DAY_MAX_DAYS:
+            requested = "day"
+        elif span_days <= GRID_AUTO_WEEK_MAX_DAYS:
+            requested = "week"
+        else:
+            requested = "month"
+
+    level = GRID_GRANULARITIES.index(requested)
+    while level < len(GRID_GRANULARITIES) - 1:
+        starts, _, _ = grid_buckets(project_start, project_end, GRID_GRANULARITIES[level], calendar)
+        if len(starts) <= GRID_MAX_COLUMNS:
+            break
+        print(f"Gantt grid: {len(starts)} {GRID_GRANULARITIES[level]} columns is too wide, using a coarser grid")
+        level += 1
+    return GRID_GRANULARITIES[level]
+
+
+def grid_buckets(project_start, project_end, granularity, calendar=None):
+    """
+    (bucket starts, bucket ends, header labels) covering the project.
+    Day buckets are the working days of calendar; week buckets start on
+    Mondays and month buckets on the 1st, so edge buckets can stick out of
+    the project range.
+    """
+    if granularity == "week":
+        first = (project_start - pd.Timedelta(days=project_start.weekday())).normalize()
+        starts = pd.date_range(first, project_end, freq="7D")
+        return starts, starts + pd.Timedelta(days=6), starts.strftime("w/c %Y-%m-%d").tolist()
+    if granularity == "month":
+        starts = pd.date_range(project_start.normalize().replace(day=1), project_end, freq="MS")
+        return starts, starts + pd.offsets.MonthEnd(0), starts.strftime("%b %Y").tolist()
 
-    end_col = fuzzy_find_column(df.columns, [
-    "end","end date","finish","to","deadline","completion","close","closing","planned end",
-    "enddate","finish date","ending","ending date"
-     ])
+    days = pd.date_range(project_start.normalize(), project_end)
+    if calendar is not None:
+        days = days[np.is_busday(days.to_numpy(dtype="datetime64[D]"), busdaycal=calendar)]
+    return days, days, days.strftime("%Y-%m-%d").tolist()
 
-    if not task_col or not start_col or not end_col:
-        # helpful: list detected columns and reason
-        raise ValueError(f"Could not detect Task/Start/End columns. Found columns: {list(df.columns)}")
+
+def task_bucket_spans(starts, ends, bucket_starts, bucket_ends, calendar):
+    """
+    Interval form of the Gantt occupancy matrix: for every task, the first and
+    last bucket holding at least one of its working days, and whether the task
+    covers all working days of those two edge buckets (partial buckets get a
+    lighter shade). Tasks with no working day in the grid get last < first.
+    """
+    one_day = np.timedelta64(1, "D")
+    b_start = bucket_starts.to_numpy(dtype="datetime64[D]")
+    b_end = bucket_ends.to_numpy(dtype="datetime64[D]")
+    s = starts.to_numpy(dtype="datetime64[D]")
+    e = ends.to_numpy(dtype="datetime64[D]")
+    if len(b_start) == 0:
+        # no working day in the whole range (e.g. a weekend-only plan with weekends excluded)
+        no_bucket = np.zeros(len(s), dtype=bool)
+        return np.zeros(len(s), dtype=np.int64), np.full(len(s), -1, dtype=np.int64), no_bucket, no_bucket
+    bucket_work = np.busday_count(b_start, b_end + one_day, busdaycal=calendar)
+
+    def work_in(idx):
+        # working days the task has inside bucket idx (0 outside the grid)
+        inside = (idx >= 0) & (idx < len(b_start))
+        idx = np.clip(idx, 0, len(b_start) - 1)
+        lo = np.maximum(s, b_start[idx])
+        hi = np.maximum(np.minimum(e, b_end[idx]) + one_day, lo)
+        return np.where(inside, np.busday_count(lo, hi, busdaycal=calendar), 0)
+
+    first = np.searchsorted(b_start, s, side="right") - 1
+    last = np.searchsorted(b_start, e, side="right") - 1
+    # the bucket the task starts (ends) in may hold none of its working days
+    first_work = work_in(first)
+    first = np.where(first_work > 0, first, first + 1)
+    first_work = work_in(first)
+    last_work = work_in(last)
+    last = np.where(last_work > 0, last, last - 1)
+    last_work = work_in(last)
+
+    first_full = first_work >= bucket_work[np.clip(first, 0, len(b_start) - 1)]
+    last_full = last_work >= bucket_work[np.clip(last, 0, len(b_start) - 1)]
+    return first, last, first_full, last_full
+
+
+def write_gantt_sheet(workbook, df, bucket_starts, bucket_ends=None, labels=None, calendar=None):
+    """
+    Write the "Gantt Chart" sheet: one row per task, one column per bucket.
+    With only bucket_starts given, every date is its own one-day bucket.
+    """
+    if bucket_ends is None:
+        bucket_ends = bucket_starts
+    if labels is None:
+        labels = bucket_starts.strftime("%Y-%m-%d").tolist()
+    if calendar is None:
+        calendar = work_calendar()
+
+    gantt_sheet = workbook.add_worksheet("Gantt Chart")
+    # header row
+    gantt_sheet.write(0, 0, "Task")
+    gantt_sheet.write_row(0, 1, labels)
+    gantt_sheet.write_column(1, 0, df["Task"].tolist())
+
+    fill_fmt = workbook.add_format({"bg_color": GRID_FILL_COLOR})
+    partial_fmt = workbook.add_format({"bg_color": GRID_PARTIAL_COLOR})
+    # one contiguous bar per task (grid column 0 holds the task name),
+    # edge buckets the task only partly covers in the lighter shade
+    first, last, first_full, last_full = task_bucket_spans(
+        df["Start Date"], df["End Date"], bucket_starts, bucket_ends, calendar)
+    has_partial = False
+    spans = zip((first + 1).tolist(), (last + 1).tolist(), first_full.tolist(), last_full.tolist())
+    for row, (first_col, last_col, first_is_full, last_is_full) in enumerate(spans, start=1):
+        if last_col < first_col:
+            continue
+        if first_col == last_col:
+            first_is_full = last_is_full = first_is_full and last_is_full
+        full_from = first_col if first_is_full else first_col + 1
+        full_to = last_col if last_is_full else last_col - 1
+        if not first_is_full:
+            gantt_sheet.write_blank(row, first_col, "", partial_fmt)
+        if not last_is_full and last_col != first_col:
+            gantt_sheet.write_blank(row, last_col, "", partial_fmt)
+        has_partial = has_partial or not (first_is_full and last_is_full)
+        if full_to > full_from:
+            gantt_sheet.merge_range(row, full_from, row, full_to, "", fill_fmt)
+        elif full_to == full_from:
+            gantt_sheet.write_blank(row, full_from, "", fill_fmt)
+
+    if has_partial:
+        legend_row = len(df) + 2
+        gantt_sheet.write_blank(legend_row, 1, "", partial_fmt)
+        gantt_sheet.write(legend_row, 2, "Task covers only part of the period's working days")
+
+    gantt_sheet.set_column(0, 0, 30)
+    gantt_sheet.set_column(1, len(labels), 12)
+    return gantt_sheet
+
+
+def preview_pages(df, page_size=PREVIEW_PAGE_SIZE, max_pages=PREVIEW_MAX_PAGES):
+    """
+    Split the schedule into preview pages of at most page_size tasks.
+    Plans longer than one page get an "Overview" page first with at most
+    page_size bars, each aggregating a run of consecutive tasks (earliest
+    start to latest end), followed by the first max_pages detail pages.
+    Returns a list of (title, frame) with columns Task / Start Date / End Date.
+    """
+    df = df[["Task", "Start Date", "End Date"]]
+    if len(df) <= page_size:
+        return [("Gantt Chart Preview", df)]
+
+    group_size = -(-len(df) // page_size)  # ceil, keeps the overview within one page
+    group_no = np.arange(len(df)) // group_size
+    grouped = df.groupby(group_no, sort=True)
+    overview = pd.DataFrame({
+        "Start Date": grouped["Start Date"].min(),
+        "End Date": grouped["End Date"].max(),
+    })
+    first_task = overview.index.to_numpy() * group_size + 1
+    last_task = np.minimum(first_task + group_size - 1, len(df))
+    overview.insert(0, "Task", [f"Tasks {a}-{b}" for a, b in zip(first_task, last_task)])
+
+    n_pages = -(-len(df) // page_size)
+    pages = [(f"Gantt Chart Overview ({len(df)} tasks, {n_pages} pages)", overview)]
+    for page in range(min(n_pages, max_pages)):
+        start = page * page_size
+        pages.append((f"Gantt Chart Preview - page {page + 1} of {n_pages}", df.iloc[start:start + page_size]))
+    return pages
+
+
+def render_gantt_page(page_df, output_path, title="Gantt Chart Preview", page_size=PREVIEW_PAGE_SIZE):
+    """
+    Draw one preview page with the object-oriented Figure API (no pyplot
+    global state, safe under threaded workers). All bars go through a single
+    barh call; figure height is bounded by page_size rather than the plan size.
+    The output format follows the extension of output_path (.png or .svg).
+    """
+    valid = (page_df["Start Date"].notna() & page_df["End Date"].notna()).to_numpy()
+    starts = page_df["Start Date"].to_numpy(dtype="datetime64[D]")
+    ends = page_df["End Date"].to_numpy(dtype="datetime64[D]")
+    lefts = mdates.date2num(starts[valid])
+    widths = (ends - starts)[valid].astype(np.int64) + 1
+    rows = np.arange(len(page_df))
+
+    # fixed margins (labels are truncated) so the page is laid out in a single draw
+    height = max(4, 0.3 * min(len(page_df), page_size) + 1.5)
+    fig = Figure(figsize=(PREVIEW_WIDTH, height))
+    fig.subplots_adjust(left=PREVIEW_LABEL_INCHES / PREVIEW_WIDTH, right=0.98, top=1 - 0.5 / height, bottom=1.0 / height)
+    ax = fig.add_subplot()
+    ax.barh(rows[valid], widths, left=lefts, height=0.6)
+    ax.set_yticks(rows)
+    ax.set_yticklabels([str(t)[:PREVIEW_LABEL_CHARS] for t in page_df["Task"]])
+    ax.set_ylim(len(page_df) - 0.5, -0.5)  # first task at the top
+    ax.xaxis_date()
+    ax.set_xlabel("Date")
+    ax.set_title(title)
+    ax.tick_params(axis="x", labelrotation=30)
+    with timer("gantt_render", format=os.path.splitext(output_path)[1].lstrip(".")):
+        fig.savefig(output_path)
+    return output_path
+
+
+def render_gantt_preview(df, output_dir, name, fmt="png", page_size=PREVIEW_PAGE_SIZE, max_pages=PREVIEW_MAX_PAGES):
+    """
+    Render the preview images for a schedule into output_dir as
+    {name}.{fmt} (first page / overview) and {name}_p{n}.{fmt} for further
+    pages. Returns the list of file names written, first page first.
+    """
+    fmt = fmt if fmt in PREVIEW_FORMATS else "png"
+    files = []
+    for i, (title, page_df) in enumerate(preview_pages(df, page_size, max_pages)):
+        file_name = f"{name}.{fmt}" if i == 0 else f"{name}_p{i}.{fmt}"
+        render_gantt_page(page_df, os.path.join(output_dir, file_name), title, page_size)
+        files.append(file_name)
+    return files
+
+
+def generate_gantt_chart(excel_path, include_saturday=True, include_sunday=True, output_excel=None, holidays=None,
+                         sheet_name=None, granularity="auto"):
+    """
+    Reads excel_path (.xlsx or .csv), detects Task/Start/End columns flexibly
+    (in sheet_name, or the first sheet that has them) and reads only those
+    columns, parses dates,
+    writes a Gantt excel to output_excel (default: next to the input) and
+    returns (output_excel_path, meta_dict).
+    Duration (Days) counts working days: weekends per include_saturday /
+    include_sunday and the optional holidays (dates, e.g. from load_holidays)
+    are skipped, and the same days are left out of the grid.
+    The grid has one column per day, week or month: granularity "auto"
+    picks it from the horizon (see choose_granularity).
+    meta_dict contains keys: open_tasks (list), project_start, project_end,
+    ai_summary ("" while still running; poll get_summary(summary_job)),
+    summary_job, sheet (the sheet used, None for CSV), analytics (the
+    analyze_schedule figures behind the prompt)
+    and schedule: the typed task DataFrame written to "Task List" (Task,
+    Start Date, End Date as datetime64, Duration (Days), ...), so callers
+    never have to read the workbook back.
+    """
+    # read only the Task/Start/End columns (header sniffed first, then streamed)
+    df, sheet = read_columns(excel_path, detect_schedule_columns, sheet_name)
+    task_col, start_col, end_col = detect_schedule_columns(list(df.columns))
 
     # rename for consistency
     df = df.rename(columns={task_col: "Task", start_col: "Start Date", end_col: "End Date"})
 
     # parse dates robustly
-    df["Start Date"] = df["Start Date"].apply(smart_date_parse)
-    df["End Date"] = df["End Date"].apply(smart_date_parse)
+    df["Start Date"] = parse_date_column(df["Start Date"])
+    df["End Date"] = parse_date_column(df["End Date"])
 
     # find tasks with missing start or end
     missing_start = df[df["Start Date"].isna()]["Task"].tolist()
@@ -154,8 +713,9 @@ def generate_gantt_chart(excel_path, include_saturday=True, include_sunday=True)
     today = pd.Timestamp.today().normalize()
     df.loc[df["End Date"].isna(), "End Date"] = today
 
-    # Duration (days, inclusive)
-    df["Duration (Days)"] = (df["End Date"] - df["Start Date"]).dt.days + 1
+    # Duration (working days, inclusive)
+    calendar = work_calendar(include_saturday, include_sunday, holidays)
+    df["Duration (Days)"] = working_days(df["Start Date"], df["End Date"], calendar)
 
     # Prepare AI prompt (include weekend handling & open tasks)
     weekend_msg = []
@@ -163,14 +723,17 @@ def generate_gantt_chart(excel_path, include_saturday=True, include_sunday=True)
         weekend_msg.append("Saturdays excluded")
     if not include_sunday:
         weekend_msg.append("Sundays excluded")
+    if len(calendar.holidays):
+        weekend_msg.append(f"{len(calendar.holidays)} holidays excluded")
     weekend_info = ", ".join(weekend_msg) if weekend_msg else "All days included"
+    weekend_info += "; task durations are counted in working days"
 
-    open_tasks_msg = "No open-ended tasks."
-    if missing_end:
-        open_tasks_msg = "Open-ended tasks (no End Date provided): " + ", ".join(map(str, missing_end))
+    # overlap / parallelism / span figures are computed here; the model only phrases them
+    analytics = analyze_schedule(df, missing_end, calendar)
 
     prompt = f"""
-      You are an expert project analyst. Analyze the project schedule below and generate a clear, structured summary.
+      You are an expert project analyst. Write a clear, structured summary of the project schedule
+      described by the pre-computed figures below. Use only these figures; do not invent tasks or dates.
 
       Weekend rules applied:
       - Saturdays included: {include_saturday}
@@ -178,71 +741,66 @@ def generate_gantt_chart(excel_path, include_saturday=True, include_sunday=True)
 
       Additional logic notes:
       {weekend_info}
-      {open_tasks_msg}
 
-      Project Data:
-      {df[['Task','Start Date','End Date','Duration (Days)']].to_string(index=False)}
+      Schedule figures:
+{textwrap.indent(schedule_digest(analytics), "      ")}
 
       Please provide:
       1. Overall project timeline (start date, end date, total duration).
       2. Whether weekends were counted or excluded in calculations (mention Saturday/Sunday rules clearly).
       3. Key milestones (earliest starting task and latest ending task).
       4. Top 3 longest tasks (if duration > 10 days).
-      5. List of overlapping/parallel tasks with short explanation.
+      5. Overlapping/parallel work: peak parallelism, most overlapped tasks and idle gaps, with short explanation.
       6. A concise 2–3 sentence final conclusion summarizing project pace and workload distribution.
     """
 
-    try:
-        haiku_summary = call_haiku(prompt)
-    except Exception as e:
-        # don't fail entire processing if AI call fails — provide fallback text
-        haiku_summary = f"(AI summary failed: {e})"
-
     # date range
-    all_dates = pd.date_range(df["Start Date"].min(), df["End Date"].max())
-    if not include_saturday:
-        all_dates = all_dates[all_dates.weekday != 5]
-    if not include_sunday:
-        all_dates = all_dates[all_dates.weekday != 6]
+    project_start, project_end = df["Start Date"].min(), df["End Date"].max()
+    granularity = choose_granularity(project_start, project_end, granularity, calendar)
+    bucket_starts, bucket_ends, labels = grid_buckets(project_start, project_end, granularity, calendar)
 
     # create output excel path
-    base = os.path.splitext(excel_path)[0]
-    output_excel = f"{base}_gantt_output.xlsx"
-
-    # write excel
-    writer = pd.ExcelWriter(output_excel, engine="xlsxwriter", datetime_format='yyyy-mm-dd')
-    df.to_excel(writer, index=False, sheet_name="Task List")
-
-    workbook = writer.book
-    gantt_sheet = workbook.add_worksheet("Gantt Chart")
-    # header row
-    gantt_sheet.write(0, 0, "Task")
-    for i, d in enumerate(all_dates):
-        gantt_sheet.write(0, i + 1, d.strftime("%Y-%m-%d"))
-
-    fill_fmt = workbook.add_format({"bg_color": "#4F81BD"})
-    # write rows
-    for r, row in df.iterrows():
-        gantt_sheet.write(r + 1, 0, row["Task"])
-        for c, d in enumerate(all_dates):
-            if row["Start Date"] <= d <= row["End Date"]:
-                gantt_sheet.write(r + 1, c + 1, "", fill_fmt)
-
-    gantt_sheet.set_column(0, 0, 30)
-    gantt_sheet.set_column(1, len(all_dates), 12)
+    if output_excel is None:
+        base = os.path.splitext(excel_path)[0]
+        output_excel = f"{base}_gantt_output.xlsx"
 
-    # AI summary sheet
-    summary_sheet = workbook.add_worksheet("AI Summary")
-    summary_sheet.write("A1", "Project Analysis:")
-    summary_sheet.write("A3", haiku_summary)
+    # the summary runs in parallel with grid writing and preview rendering
+    summary_job = start_summary_job(prompt)
 
-    writer.close()
+    # write excel
+    inline = False
+    try:
+        with timer("excel_write"):
+            writer = pd.ExcelWriter(output_excel, engine="xlsxwriter", datetime_format='yyyy-mm-dd')
+            df.to_excel(writer, index=False, sheet_name="Task List")
+
+            workbook = writer.book
+            write_gantt_sheet(workbook, df, bucket_starts, bucket_ends, labels, calendar)
+
+            # AI summary sheet: use the summary if it is already back, otherwise
+            # the background job fills it in after the file is closed
+            haiku_summary = SUMMARY_JOBS.get(summary_job, {}).get("summary")
+            inline = haiku_summary is not None
+            summary_sheet = workbook.add_worksheet("AI Summary")
+            summary_sheet.write("A1", "Project Analysis:")
+            summary_sheet.write("A3", haiku_summary if inline else SUMMARY_PENDING)
+
+            writer.close()
+    except Exception:
+        finish_summary_job(summary_job, None, inline)
+        raise
+    finish_summary_job(summary_job, output_excel, inline)
 
     meta = {
         "open_tasks": missing_end,
         "project_start": df["Start Date"].min(),
         "project_end": df["End Date"].max(),
-        "ai_summary": haiku_summary
+        "ai_summary": haiku_summary or "",
+        "summary_job": summary_job,
+        "granularity": granularity,
+        "sheet": sheet,
+        "analytics": analytics,
+        "schedule": df
     }
 
     return output_excel, meta
@@ -0,0 +1,162 @@
+# modules/history_store.py
+# Flowchart session history in SQLite: indexed by session id and by
+# (owner, seq) so lookups and sidebar pages cost the same at any history size.
+import os
+import json
+import sqlite3
+
+from modules import sqlite_util
+
+HISTORY_DB = os.getenv("FLOWCHART_HISTORY_DB", "flowchart_history.db")
+# the old single-file index, imported once into an empty database
+LEGACY_HISTORY_INDEX = "chat_history.json"
+# owner of the imported sessions: they were shared by everyone and have no
+# user, so signed-in users see them next to their own (anonymous visitors
+# don't); the colon keeps it apart from any sign-in name
+LEGACY_OWNER = "legacy:"
+HISTORY_PAGE_SIZE = int(os.getenv("FLOWCHART_HISTORY_PAGE_SIZE", "30"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    owner TEXT NOT NULL DEFAULT '',
+    prompt TEXT NOT NULL,
+    json_file TEXT NOT NULL,
+    image_file TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_owner_seq ON sessions (owner, seq DESC);
+-- edits are stored as the patch ops of each version, not as full copies
+CREATE TABLE IF NOT EXISTS session_edits (
+    session_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    ops TEXT NOT NULL,
+    image_file TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (session_id, version)
+);
+-- the full flowchart every few versions, so loading replays only the edits after it
+CREATE TABLE IF NOT EXISTS session_snapshots (
+    session_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    flowchart TEXT NOT NULL,
+    image_file TEXT NOT NULL,
+    PRIMARY KEY (session_id, version)
+);
+"""
+COLUMNS = ("id", "prompt", "json_file", "image_file", "timestamp")
+
+def connection(db_path=HISTORY_DB):
+    return sqlite_util.connection(db_path, SCHEMA, on_create=import_legacy_index)
+
+
+def import_legacy_index(conn, path=LEGACY_HISTORY_INDEX):
+    """
+    Copy chat_history.json (newest first) into an empty table, oldest first,
+    under LEGACY_OWNER. In a database an earlier import filled under the
+    anonymous owner "", those entries are moved to LEGACY_OWNER instead.
+    """
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not import {path}: {e}")
+        return 0
+    entries = [e for e in reversed(entries) if e.get("id")]
+    if conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone():
+        with conn:
+            moved = conn.executemany("UPDATE sessions SET owner = ? WHERE id = ? AND owner = ''",
+                                     [(LEGACY_OWNER, e["id"]) for e in entries]).rowcount
+        if moved > 0:
+            print(f"Moved {moved} flowchart sessions from {path} to the signed-in history")
+        return 0
+    rows = [(LEGACY_OWNER,) + tuple(e.get(c, "") for c in COLUMNS) for e in entries]
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO sessions (owner, id, prompt, json_file, image_file, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    print(f"Imported {len(rows)} flowchart sessions from {path}")
+    return len(rows)
+
+
+def owner_filter(owners):
+    """SQL condition and params for one owner or a tuple of owners."""
+    owners = (owners or "",) if isinstance(owners, str) or owners is None else tuple(owners)
+    return f"owner IN ({', '.join('?' * len(owners))})", list(owners)
+
+
+def add_session(entry, owner="", db_path=HISTORY_DB):
+    """Insert one history entry (dict with COLUMNS) in a single transaction."""
+    conn = connection(db_path)
+    with conn:
+        conn.execute(
+            "INSERT INTO sessions (id, owner, prompt, json_file, image_file, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            (entry["id"], owner or "", entry["prompt"], entry["json_file"], entry["image_file"], entry["timestamp"]))
+    return entry
+
+
+def get_session(session_id, owner="", db_path=HISTORY_DB):
+    """The entry for session_id if it belongs to owner (or one of a tuple of owners), else None."""
+    condition, params = owner_filter(owner)
+    row = connection(db_path).execute(
+        f"SELECT seq, id, prompt, json_file, image_file, timestamp FROM sessions WHERE id = ? AND {condition}",
+        [session_id] + params).fetchone()
+    return dict(row) if row else None
+
+
+def list_sessions(owner="", limit=HISTORY_PAGE_SIZE, before=None, db_path=HISTORY_DB):
+    """
+    One page of owner's sessions (or a tuple of owners'), newest first. Pass
+    the returned cursor as before= to get the next page; the cursor is None
+    on the last page.
+    """
+    condition, params = owner_filter(owner)
+    query = f"SELECT seq, id, prompt, json_file, image_file, timestamp FROM sessions WHERE {condition}"
+    if before is not None:
+        query += " AND seq < ?"
+        params.append(int(before))
+    query += " ORDER BY seq DESC LIMIT ?"
+    params.append(limit + 1)
+    rows = [dict(r) for r in connection(db_path).execute(query, params)]
+    cursor = rows[limit - 1]["seq"] if len(rows) > limit else None
+    return rows[:limit], cursor
+
+
+def add_edit(session_id, version, ops, image_file, timestamp, snapshot=None, db_path=HISTORY_DB):
+    """
+    Record ops as the given version of a session, plus the full flowchart
+    of that version if snapshot is given (same transaction). Returns False
+    if that version already exists (another edit got there first).
+    """
+    conn = connection(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO session_edits (session_id, version, ops, image_file, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (session_id, version, json.dumps(ops), image_file, timestamp))
+            if snapshot is not None:
+                conn.execute(
+                    "INSERT INTO session_snapshots (session_id, version, flowchart, image_file) VALUES (?, ?, ?, ?)",
+                    (session_id, version, json.dumps(snapshot), image_file))
+    except sqlite3.IntegrityError:
+        return False
+    return True
+
+
+def latest_snapshot(session_id, db_path=HISTORY_DB):
+    """The newest snapshot of a session as {version, flowchart, image_file}, or None."""
+    row = connection(db_path).execute(
+        "SELECT version, flowchart, image_file FROM session_snapshots WHERE session_id = ? "
+        "ORDER BY version DESC LIMIT 1", (session_id,)).fetchone()
+    return dict(row, flowchart=json.loads(row["flowchart"])) if row else None
+
+
+def list_edits(session_id, after_version=0, db_path=HISTORY_DB):
+    """The edits of a session newer than after_version, in version order, ops decoded."""
+    rows = connection(db_path).execute(
+        "SELECT version, ops, image_file, timestamp FROM session_edits WHERE session_id = ? AND version > ? "
+        "ORDER BY version", (session_id, after_version))
+    return [dict(r, ops=json.loads(r["ops"])) for r in rows]
@@ -0,0 +1,268 @@
+# modules/metrics.py
+# In-process counters and histograms (stage latencies, errors, Bedrock
+# tokens, HTTP requests) rendered in the Prometheus text format. Every
+# worker process flushes its values to METRICS_DIR so /metrics, served by
+# whichever worker gets the scrape, can report the sum over all of them.
+# Values of exited processes are folded into DEAD_FILE rather than dropped:
+# every metric here is a counter or histogram, and those must never go down.
+import os
+import json
+import time
+import fcntl
+import atexit
+import threading
+from contextlib import contextmanager
+
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+METRICS_FLUSH_SECONDS = 5
+# a process that stopped flushing this long ago is treated as exited (when
+# gunicorn's child_exit hook did not report it)
+METRICS_STALE_SECONDS = 600
+DEAD_FILE = "dead.json"
+LOCK_FILE = ".lock"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HELP = {
+    "stage_duration_seconds": ("histogram", "Time spent in a heavy local step or external call"),
+    "stage_errors_total": ("counter", "Stages that raised an exception"),
+    "bedrock_requests_total": ("counter", "Bedrock model invocations"),
+    "bedrock_tokens_total": ("counter", "Bedrock tokens reported in the response bodies"),
+    "polly_characters_total": ("counter", "Characters sent to Polly"),
+    "http_request_duration_seconds": ("histogram", "Flask request latency"),
+}
+
+LOCK = threading.Lock()
+COUNTERS = {}    # (name, labels) -> value
+HISTOGRAMS = {}  # (name, labels) -> [bucket counts..., sum, count]
+FLUSHER = {"pid": None}
+
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = (name, label_key(labels))
+    with LOCK:
+        COUNTERS[key] = COUNTERS.get(key, 0) + value
+    start_flusher()
+
+
+def observe(name, value, **labels):
+    key = (name, label_key(labels))
+    with LOCK:
+        hist = HISTOGRAMS.get(key)
+        if hist is None:
+            hist = HISTOGRAMS[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+    start_flusher()
+
+
+@contextmanager
+def timer(stage, **labels):
+    """Time the with-block as stage_duration_seconds{stage=...}; exceptions also count as errors."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc("stage_errors_total", stage=stage, **labels)
+        raise
+    finally:
+        observe("stage_duration_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+
+def record_bedrock(stage, model_id, input_tokens=None, output_tokens=None):
+    """One Bedrock call and its token usage (None when the response didn't say)."""
+    inc("bedrock_requests_total", stage=stage, model=model_id)
+    if input_tokens:
+        inc("bedrock_tokens_total", input_tokens, stage=stage, model=model_id, kind="input")
+    if output_tokens:
+        inc("bedrock_tokens_total", output_tokens, stage=stage, model=model_id, kind="output")
+
+
+def bedrock_usage(body):
+    """(input, output) token counts from an invoke_model response body (Anthropic or Llama)."""
+    usage = body.get("usage") or {}
+    return (usage.get("input_tokens", body.get("prompt_token_count")),
+            usage.get("output_tokens", body.get("generation_token_count")))
+
+
+def snapshot():
+    with LOCK:
+        return as_snapshot(COUNTERS, HISTOGRAMS)
+
+
+def flush(metrics_dir=METRICS_DIR):
+    """Write this process's values to METRICS_DIR/<pid>.json (atomically)."""
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, f"{os.getpid()}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def start_flusher():
+    # started lazily and per process: a thread started before a fork would not run in the workers
+    if FLUSHER["pid"] == os.getpid():
+        return
+    with LOCK:
+        if FLUSHER["pid"] == os.getpid():
+            return
+        FLUSHER["pid"] = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            try:
+                flush()
+            except OSError as e:
+                print(f"Could not flush metrics: {e}")
+
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+    # the last few seconds of a worker that exits normally
+    atexit.register(flush)
+
+
+@contextmanager
+def dir_lock(metrics_dir, exclusive):
+    """flock on METRICS_DIR: exclusive to fold snapshots into DEAD_FILE, shared to read them."""
+    os.makedirs(metrics_dir, exist_ok=True)
+    with open(os.path.join(metrics_dir, LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_snapshot(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def process_files(metrics_dir):
+    """{pid file name: mtime} of the per-process snapshots in metrics_dir."""
+    files = {}
+    try:
+        names = os.listdir(metrics_dir)
+    except OSError:
+        return files
+    for name in names:
+        if name.endswith(".json") and name[:-len(".json")].isdigit():
+            try:
+                files[name] = os.path.getmtime(os.path.join(metrics_dir, name))
+            except OSError:
+                continue
+    return files
+
+
+def fold_dead(metrics_dir, names):
+    """Add the named process snapshots to DEAD_FILE and remove them (hold the exclusive dir_lock)."""
+    dead_path = os.path.join(metrics_dir, DEAD_FILE)
+    snapshots = [read_snapshot(dead_path)]
+    paths = [os.path.join(metrics_dir, name) for name in names]
+    snapshots.extend(read_snapshot(path) for path in paths)
+    counters, histograms = merge(s for s in snapshots if s)
+    tmp_path = f"{dead_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(as_snapshot(counters, histograms), f)
+    os.replace(tmp_path, dead_path)
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def mark_process_dead(pid, metrics_dir=METRICS_DIR):
+    """Keep an exited process's counts in DEAD_FILE (gunicorn's child_exit hook calls this)."""
+    with dir_lock(metrics_dir, exclusive=True):
+        if f"{pid}.json" in process_files(metrics_dir):
+            fold_dead(metrics_dir, [f"{pid}.json"])
+
+
+def collect(metrics_dir=METRICS_DIR):
+    """
+    Sum of all processes' snapshots plus DEAD_FILE, with this process's live
+    values instead of its file. Processes silent for METRICS_STALE_SECONDS are
+    folded into DEAD_FILE first.
+    """
+    own = f"{os.getpid()}.json"
+    now = time.time()
+    stale = [name for name, mtime in process_files(metrics_dir).items()
+             if name != own and now - mtime > METRICS_STALE_SECONDS]
+    if stale:
+        with dir_lock(metrics_dir, exclusive=True):
+            # another scrape may have folded them in the meantime
+            fold_dead(metrics_dir, [name for name in stale if name in process_files(metrics_dir)])
+
+    snapshots = [snapshot()]
+    if os.path.isdir(metrics_dir):
+        with dir_lock(metrics_dir, exclusive=False):
+            names = [name for name in process_files(metrics_dir) if name != own] + [DEAD_FILE]
+            snapshots.extend(read_snapshot(os.path.join(metrics_dir, name)) for name in names)
+    return merge(s for s in snapshots if s)
+
+
+def merge(snapshots):
+    """(counters, histograms) summed over snapshots."""
+    counters, histograms = {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, hist in snap["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.setdefault(key, [0] * len(hist))
+            for i, value in enumerate(hist):
+                total[i] += value
+    return counters, histograms
+
+
+def as_snapshot(counters, histograms):
+    return {
+        "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [[name, list(labels), list(hist)] for (name, labels), hist in histograms.items()],
+    }
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in pairs) + "}"
+
+
+def render_metrics(metrics_dir=METRICS_DIR):
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    counters, histograms = collect(metrics_dir)
+    lines = []
+    for name in sorted({n for n, _ in counters} | {n for n, _ in histograms}):
+        kind, text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        for (n, labels), hist in sorted(histograms.items()):
+            if n != name:
+                continue
+            # observe() counts a value in every bucket it fits, so these are cumulative already
+            for bound, count in zip(BUCKETS, hist):
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', str(bound))])} {count}")
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+            lines.append(f"{name}_sum{format_labels(labels)} {hist[-2]}")
+            lines.append(f"{name}_count{format_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
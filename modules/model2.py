@@ -4,15 +4,12 @@ import sys
 import json
 import re
 import time
-import boto3
 import tempfile
 import subprocess
 from botocore.exceptions import BotoCoreError, ClientError
-import xml.sax.saxutils as saxutils
-
-# AWS Clients
-bedrock_client = boto3.client("bedrock-runtime", region_name="ap-south-1")
-polly_client = boto3.client("polly")
+# AWS clients are created on first use, not at import
+from modules.bedrock_stream import bedrock_client, aws_client
+from modules.metrics import timer, inc, record_bedrock, bedrock_usage
 
 # Configuration
 MODEL_ID = "meta.llama3-70b-instruct-v1:0"
@@ -59,18 +56,20 @@ def convert_to_story(text, max_gen_len=512, temp=0.1, top_p=0.9, max_retries=6):
         }
 
         try:
-            resp = bedrock_client.invoke_model(
-                modelId=MODEL_ID,
-                body=json.dumps(body),
-                contentType="application/json",
-                accept="application/json"
-            )
-            resp_body = json.loads(resp["body"].read())
+            with timer("convert_to_story", model=MODEL_ID):
+                resp = bedrock_client().invoke_model(
+                    modelId=MODEL_ID,
+                    body=json.dumps(body),
+                    contentType="application/json",
+                    accept="application/json"
+                )
+                resp_body = json.loads(resp["body"].read())
+            record_bedrock("convert_to_story", MODEL_ID, *bedrock_usage(resp_body))
             gen = resp_body.get("generation", "").strip()
             if gen:
                 return gen
 
-        except bedrock_client.exceptions.ThrottlingException:
+        except bedrock_client().exceptions.ThrottlingException:
             wait_time = 2 ** attempt  # exponential backoff (2, 4, 8, 16...)
             print(f"[Throttled] Too many requests. Retrying in {wait_time}s...")
             time.sleep(wait_time)
@@ -93,64 +92,116 @@ def enforce_slide_numbers_in_story(original_batch_text, generated_story):
         corrected_paragraphs.append(para.strip())
     return "\n\n".join(corrected_paragraphs)
 
+# SSML compilation
+PUNCTUATION_BREAK = '<break time="300ms"/>'
+SSML_BREAK_PATTERN = re.compile(r'<break time="\d+ms"/>')
+SSML_PUNCTUATION_PATTERN = re.compile(r'[,:.;!?]')
+
+# One scan finds every spot where the narration needs rewriting. The leading
+# character class lets the regex engine skip plain prose quickly; each branch
+# then checks which character it consumed.
+#   tag     - a break tag already present in the text (kept verbatim)
+#   slide   - the "S" of "Slide N:", which gets the slide pause in front of it
+#   number  - "4.8" -> "4 point 8", "10 %" -> "10 percent", "2.5%" -> both
+#   element - "H2O" -> "H 2O", "CaCO3" -> "CaCO 3"
+SSML_TOKEN_PATTERN = re.compile(
+    r'[<\dA-Zsſ]'
+    r'(?:(?P<tag>(?<=<)break time="\d+ms"/>)'
+    r'|(?P<slide>(?<=[sSſ])(?<!\w.)(?=(?i:lide)\s*\d+:))'
+    r'|(?P<number>(?<=\d)(?:\.\d(?:\s*%)?|\s*%))'
+    r'|(?P<element>(?<=[A-Z])[a-z]?(?=\d)))'
+)
+
+SSML_ESCAPE_TABLE = str.maketrans({
+    "&": "&amp;" + PUNCTUATION_BREAK,
+    "<": "&lt;" + PUNCTUATION_BREAK,
+    ">": "&gt;" + PUNCTUATION_BREAK,
+    **{mark: mark + PUNCTUATION_BREAK for mark in ",:.;!?"},
+})
+
+
+def escape_ssml_run(run):
+    """XML-escape a run of plain narration and add a short break after punctuation."""
+    # str.translate wins on the short runs between numbers; regex wins on prose
+    if len(run) < 32:
+        return run.translate(SSML_ESCAPE_TABLE)
+    if "&" in run:
+        run = run.replace("&", "&amp;")
+    if "<" in run:
+        run = run.replace("<", "&lt;")
+    if ">" in run:
+        run = run.replace(">", "&gt;")
+    return SSML_PUNCTUATION_PATTERN.sub(r'\g<0>' + PUNCTUATION_BREAK, run)
+
+
 def add_ssml_tags(text, pause_duration_ms=3000):
-    def normalize_pronunciation(txt):
-        # Ensure decimals are spoken smoothly like "zero point zero four"
-        txt = re.sub(r'(\d)\.(\d)', r'\1 point \2', txt)
-        # Add 'percent' word clarity
-        txt = re.sub(r'(\d+)\s*%', r'\1 percent', txt)
-        # Common chemical/compound patterns (e.g., NaCl, H2O)
-        txt = re.sub(r'([A-Z][a-z]?)(\d+)', r'\1 \2', txt)
-        txt = re.sub(r'\b([A-Z][a-z]?[A-Z0-9]+)\b', r'\1', txt)
-        return txt
-
-
-    def insert_slide_breaks_before(txt):
-        pattern = re.compile(r'\b(Slide\s*\d+:)', flags=re.IGNORECASE)
-        return pattern.sub(lambda m: f'<break time="{pause_duration_ms}ms"/>{m.group(1)}', txt)
-
-    normalized_text = normalize_pronunciation(text)
-    text_with_slide_breaks = insert_slide_breaks_before(normalized_text)
-
-    parts = re.split(r'(<break time="\d+ms"/>)', text_with_slide_breaks)
-    escaped_parts = []
-    for part in parts:
-        if part.startswith('<break'):
-            escaped_parts.append(part)
-        else:
-            escaped_parts.append(saxutils.escape(part))
-    text_with_breaks_and_escapes = ''.join(escaped_parts)
-
-    def insert_punctuation_breaks(txt):
-        pieces = re.split(r'(<break time="\d+ms"/>)', txt)
-        new_pieces = []
-        for piece in pieces:
-            if piece.startswith('<break'):
-                new_pieces.append(piece)
+    """Compile a narration into Polly SSML in a single pass over the text."""
+    slide_break = f'<break time="{pause_duration_ms}ms"/>'
+    slide_break_is_tag = SSML_BREAK_PATTERN.fullmatch(slide_break) is not None
+
+    pieces = []
+    emit = pieces.append
+    # A segment (text between two break tags) that itself starts with "<break"
+    # has always been passed through unescaped; keep that behaviour.
+    raw = text.startswith('<break')
+    segment_start = pos = 0
+    after_percent = -1
+
+    for match in SSML_TOKEN_PATTERN.finditer(text):
+        start, end = match.span()
+        if start > pos:
+            run = text[pos:start]
+            emit(run if raw else escape_ssml_run(run))
+        pos = end
+        kind = match.lastgroup
+        token = match.group()
+
+        if kind == 'number':
+            if token[1] == '.':
+                emit(token[0] + ' point ' + token[2] + (' percent' if len(token) > 3 else ''))
             else:
-                piece = re.sub(r'([,:.;!?])(?!<break)', r'\1<break time="300ms"/>', piece)
-                new_pieces.append(piece)
-        return ''.join(new_pieces)
-
-    final_ssml_text = insert_punctuation_breaks(text_with_breaks_and_escapes)
-    ssml = f'<speak><prosody rate="85%">{final_ssml_text}</prosody></speak>'
-    return ssml
+                emit(token[0] + ' percent')
+            if token[-1] == '%':
+                after_percent = end
+        elif kind == 'element':
+            emit(token + ' ')
+        elif kind == 'tag':
+            emit(token)
+            raw = text.startswith('<break', end)
+            segment_start = end
+        else:
+            # "5%Slide 2:" reads "5 percentSlide 2:", so there is no word boundary
+            if start != after_percent:
+                if slide_break_is_tag:
+                    emit(slide_break)
+                    raw = False
+                else:
+                    raw = raw or start == segment_start
+                    emit(slide_break if raw else escape_ssml_run(slide_break))
+            emit(token)
+
+    run = text[pos:]
+    emit(run if raw else escape_ssml_run(run))
+    return '<speak><prosody rate="85%">' + ''.join(pieces) + '</prosody></speak>'
 
 def synthesize_text_chunk_to_file(text, index, output_dir):
 
     try:
-        response = polly_client.synthesize_speech(
-            Text=text,
-            TextType="ssml",
-            OutputFormat="mp3",
-            VoiceId=VOICE_ID,
-            Engine="neural"
-        )
-        if "AudioStream" in response:
-            filename = os.path.join(output_dir, f"chunk_{index}.mp3")
-            with open(filename, "wb") as f:
-                f.write(response["AudioStream"].read())
-            return filename
+        # Polly bills by characters, SSML tags included
+        inc("polly_characters_total", len(text), engine="neural")
+        with timer("polly_synthesize", engine="neural"):
+            response = aws_client("polly").synthesize_speech(
+                Text=text,
+                TextType="ssml",
+                OutputFormat="mp3",
+                VoiceId=VOICE_ID,
+                Engine="neural"
+            )
+            if "AudioStream" in response:
+                filename = os.path.join(output_dir, f"chunk_{index}.mp3")
+                with open(filename, "wb") as f:
+                    f.write(response["AudioStream"].read())
+                return filename
     except (BotoCoreError, ClientError) as e:
         print(f"[Error] Polly failed for chunk {index}: {e}")
     return None
@@ -158,7 +209,7 @@ def synthesize_text_chunk_to_file(text, index, output_dir):
 def generate_transition_audio(output_dir, voice_id=VOICE_ID):
     text = "<speak>Let's move to next slide.</speak>"
     try:
-        response = polly_client.synthesize_speech(
+        response = aws_client("polly").synthesize_speech(
             Text=text,
             TextType="ssml",
             OutputFormat="mp3",
@@ -189,7 +240,8 @@ def merge_audio_chunks(chunk_files, output_filename):
             for chunk in files_to_merge:
                 f.write(f"file '{chunk}'\n")
         command = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", output_filename]
-        subprocess.run(command, check=True)
+        with timer("audio_merge"):
+            subprocess.run(command, check=True)
         print(f"\n Final MP3 saved: {output_filename}")
 
 def split_by_slide(text):
@@ -206,7 +258,8 @@ def group_slides(slides, batch_size=1):
         yield slides[i:i + batch_size]
 
 #  Updated main() with no slide limit
-def main(txt_file, pause_ms=3000, max_valid_slide=None):
+def main(txt_file, pause_ms=3000, max_valid_slide=None, output_filename=OUTPUT_FILENAME):
+    """Narrate the slide text file into output_filename (give each job its own) and return that path."""
     if not os.path.isfile(txt_file):
         print("Text file not found:", txt_file)
         sys.exit(1)
@@ -247,7 +300,8 @@ def main(txt_file, pause_ms=3000, max_valid_slide=None):
                 continue
 
             final_story = enforce_slide_numbers_in_story(batch_text, story.strip())
-            ssml = add_ssml_tags(final_story, pause_duration_ms=pause_ms)
+            with timer("ssml_build"):
+                ssml = add_ssml_tags(final_story, pause_duration_ms=pause_ms)
 
             file_path = synthesize_text_chunk_to_file(ssml, batch_idx, tempdir)
             if file_path:
@@ -259,7 +313,9 @@ def main(txt_file, pause_ms=3000, max_valid_slide=None):
             print("No audio chunks were created.")
             sys.exit(1)
 
-        merge_audio_chunks(chunk_files, OUTPUT_FILENAME)
+        merge_audio_chunks(chunk_files, output_filename)
+
+    return output_filename
 
 if __name__ == "__main__":
     if len(sys.argv) < 2 or len(sys.argv) > 4:
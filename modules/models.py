@@ -2,14 +2,12 @@ import os
 import re
 import json
 import base64
-import boto3
 from pptx import Presentation
 from botocore.exceptions import ClientError
 from pptx2txt2 import extract_images
-from modules.model2 import main as generate_audio_story
+from modules.bedrock_stream import bedrock_client
+from modules.metrics import timer, record_bedrock, bedrock_usage
 
-# AWS Bedrock setup
-client = boto3.client("bedrock-runtime", region_name="ap-south-1")
 MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
 
 
@@ -45,8 +43,10 @@ def describe_image(image_base64, context_text):
     }
 
     body = json.dumps(prompt)
-    response = client.invoke_model(modelId=MODEL_ID, body=body)
-    data = json.loads(response["body"].read())
+    with timer("describe_image", model=MODEL_ID):
+        response = bedrock_client().invoke_model(modelId=MODEL_ID, body=body)
+        data = json.loads(response["body"].read())
+    record_bedrock("describe_image", MODEL_ID, *bedrock_usage(data))
     return data["content"][0]["text"]
 
 
@@ -80,15 +80,18 @@ def extract_text_from_presentation(pptx_path):
     return slide_texts
 
 
-def process_pptx(pptx_path, output_txt_path, images_output_dir):
-    """Extracts text and image content from slides and describes them."""
+def process_pptx(pptx_path, output_txt_path, images_output_dir, audio_output=None):
+    """Extracts text and image content from slides, describes them and narrates them into audio_output."""
+    from modules.model2 import main as generate_audio_story, OUTPUT_FILENAME as STORY_AUDIO_FILE
+
     os.makedirs(images_output_dir, exist_ok=True)
 
     # Extract slide text
     slide_text_map = extract_text_from_presentation(pptx_path)
 
     # Extract images
-    image_paths = extract_images(pptx_path, images_output_dir)
+    with timer("pptx_extract_images"):
+        image_paths = extract_images(pptx_path, images_output_dir)
 
     # Map images to slides
     slide_images_map = {}
@@ -158,9 +161,11 @@ def process_pptx(pptx_path, output_txt_path, images_output_dir):
     print(f"\n Slide analysis complete! Output written to: {output_txt_path}")
 
     print("\n Generating audio story...\n")
-    generate_audio_story(output_txt_path, pause_ms=1500)
+    audio_output = generate_audio_story(output_txt_path, pause_ms=1500,
+                                        output_filename=audio_output or STORY_AUDIO_FILE)
 
     print("\n Story generation complete!\n")
+    return audio_output
                                                          
 if __name__ == "__main__":
     import sys
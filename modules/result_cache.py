@@ -0,0 +1,123 @@
+# modules/result_cache.py
+# Memoized results on disk: one small JSON record per cache key pointing at
+# files that already exist under static/, plus size/age eviction.
+import os
+import json
+import time
+import hashlib
+import threading
+
+HASH_CHUNK_BYTES = 1024 * 1024
+CACHE_LOCK = threading.Lock()
+LAST_EVICTION = {"at": 0.0}
+
+
+def content_hash(path):
+    """sha256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(*parts):
+    """Stable key for any JSON-serializable parts (file hashes, options, versions)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def record_path(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def load_cached(cache_dir, key):
+    """
+    The record stored for key, or None. A record whose files (record["files"])
+    were evicted in the meantime counts as a miss and is dropped. A hit
+    touches the record and its files, so evict_outputs (which goes by
+    modification time) keeps entries that are in use.
+    """
+    path = record_path(cache_dir, key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    try:
+        for file_path in record.get("files", []) + [path]:
+            os.utime(file_path)
+    except OSError:
+        drop_cached(cache_dir, key)
+        return None
+    return record
+
+
+def store_cached(cache_dir, key, record):
+    """Write the record atomically (temp file + os.replace)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = record_path(cache_dir, key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def update_cached(cache_dir, key, **fields):
+    """Merge fields into an existing record (no-op if it is gone)."""
+    with CACHE_LOCK:
+        path = record_path(cache_dir, key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return
+        record.update(fields)
+        store_cached(cache_dir, key, record)
+
+
+def drop_cached(cache_dir, key):
+    try:
+        os.remove(record_path(cache_dir, key))
+    except OSError:
+        pass
+
+
+def evict_outputs(folders, max_bytes, max_age_seconds, min_interval_seconds=0):
+    """
+    Delete files under folders (recursively) older than max_age_seconds, then
+    the least recently modified ones until the total is under max_bytes.
+    Runs at most once per min_interval_seconds. Returns (files removed, bytes freed).
+    """
+    now = time.time()
+    with CACHE_LOCK:
+        if now - LAST_EVICTION["at"] < min_interval_seconds:
+            return 0, 0
+        LAST_EVICTION["at"] = now
+
+    entries = []
+    for folder in folders:
+        for root, _, names in os.walk(folder):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = freed = 0
+    for mtime, size, path in entries:
+        if now - mtime <= max_age_seconds and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        freed += size
+    if removed:
+        print(f"Evicted {removed} output files ({freed / 1024 / 1024:.1f} MB)")
+    return removed, freed
@@ -0,0 +1,103 @@
+# modules/session_store.py
+# Server-side Flask sessions in SQLite: the cookie only carries an opaque
+# random id, the session data (login info, tool results) stays on the server.
+import os
+import time
+import random
+import secrets
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from modules import sqlite_util
+
+SESSION_DB = os.getenv("SESSION_DB", "sessions.db")
+# share of saves that also purge expired rows
+PURGE_CHANCE = 0.01
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    sid TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires);
+"""
+
+SERIALIZER = TaggedJSONSerializer()
+
+
+def connection(db_path):
+    return sqlite_util.connection(db_path, SCHEMA)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was changed."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.stale_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh id (call after login to avoid session fixation)."""
+        if self.sid:
+            self.stale_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class SqliteSessionInterface(SessionInterface):
+    def __init__(self, db_path=SESSION_DB):
+        self.db_path = db_path
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = connection(self.db_path).execute(
+                "SELECT data FROM sessions WHERE sid = ? AND expires > ?", (sid, time.time())).fetchone()
+            if row:
+                return ServerSession(SERIALIZER.loads(row[0]), sid=sid)
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        conn = connection(self.db_path)
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.stale_sid:
+            with conn:
+                conn.execute("DELETE FROM sessions WHERE sid = ?", (session.stale_sid,))
+
+        if not session:
+            if session.sid and session.modified:
+                with conn:
+                    conn.execute("DELETE FROM sessions WHERE sid = ?", (session.sid,))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not (session.modified or self.should_set_cookie(app, session)):
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        expires = self.get_expiration_time(app, session)
+        expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+                (session.sid, SERIALIZER.dumps(dict(session)), expires_at))
+            if random.random() < PURGE_CHANCE:
+                conn.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+
+        response.set_cookie(
+            name, session.sid, expires=expires, httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path, secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
@@ -0,0 +1,106 @@
+# modules/sheet_reader.py
+# Column-pruned spreadsheet ingestion: read the header row first, decide which
+# columns are needed, then stream only those columns out of the file.
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR
+
+CSV_EXTENSIONS = (".csv", ".txt")
+
+
+def cell_value(cell):
+    """
+    A cell as pandas.read_excel sees it through openpyxl: "" for empty, NaN
+    for errors, integral floats as int (dates arrive as datetime already).
+    """
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def pandas_header(values):
+    """Column labels the way read_excel(header=0) names them ("Unnamed: n", "x.1" ...)."""
+    while values and values[-1] == "":
+        values = values[:-1]
+    if not values:
+        return []
+    return list(TextParser([list(values)], header=0, skip_blank_lines=False).read().columns)
+
+
+def xlsx_header(sheet):
+    for row in sheet.iter_rows(min_row=1, max_row=1):
+        return pandas_header([cell_value(cell) for cell in row])
+    return []
+
+
+def xlsx_columns(sheet, positions, names):
+    """Stream the rows of a read-only sheet, keeping only the columns at positions (0-based)."""
+    rows = []
+    for row in sheet.iter_rows(min_row=2, max_col=max(positions) + 1):
+        rows.append([cell_value(row[p]) if p < len(row) else "" for p in positions])
+    return rows_frame(rows, names)
+
+
+def rows_frame(rows, names):
+    """Rows -> DataFrame with read_excel's type inference; rows empty in every selected column are dropped."""
+    rows = [list(r) for r in rows if any(v != "" for v in r)]
+    if not rows:
+        return pd.DataFrame(columns=names)
+    return TextParser(rows, names=list(names), header=None, skip_blank_lines=False).read()
+
+
+def read_csv_header(path):
+    try:
+        return list(pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns), "utf-8-sig"
+    except UnicodeDecodeError:
+        return list(pd.read_csv(path, nrows=0, encoding="latin-1").columns), "latin-1"
+
+
+def read_columns(path, pick_columns, sheet_name=None):
+    """
+    Two-phase, column-pruned read of an .xlsx or .csv file.
+    pick_columns(header) gets the column labels of a sheet and returns the
+    labels to keep, or None if the sheet is not usable. Without sheet_name
+    the first sheet it accepts is used. Returns (DataFrame with only those
+    columns, sheet name or None for CSV). Raises ValueError listing the
+    columns found when no sheet qualifies.
+    """
+    if os.path.splitext(path)[1].lower() in CSV_EXTENSIONS:
+        header, encoding = read_csv_header(path)
+        keep = pick_columns(header)
+        if not keep:
+            raise ValueError(f"Could not detect Task/Start/End columns. Found columns: {header}")
+        df = pd.read_csv(path, usecols=list(dict.fromkeys(keep)), encoding=encoding, skip_blank_lines=True)
+        return df.dropna(how="all").reset_index(drop=True), None
+
+    # read_only: rows are parsed one at a time from the sheet XML, never held as a whole
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = {sheet.title: sheet for sheet in workbook.worksheets}
+        if sheet_name is not None and sheet_name not in sheets:
+            raise ValueError(f"Sheet '{sheet_name}' not found. Available sheets: {list(sheets)}")
+        candidates = [sheet_name] if sheet_name is not None else list(sheets)
+        found = {}
+        for name in candidates:
+            header = xlsx_header(sheets[name])
+            keep = pick_columns(header)
+            if keep:
+                keep = list(dict.fromkeys(keep))
+                positions = [header.index(k) for k in keep]
+                return xlsx_columns(sheets[name], positions, keep), name
+            found[name] = header
+    finally:
+        workbook.close()
+
+    if len(found) == 1:
+        raise ValueError(f"Could not detect Task/Start/End columns. Found columns: {next(iter(found.values()))}")
+    raise ValueError(f"Could not detect Task/Start/End columns in any sheet. Found columns: {found}")
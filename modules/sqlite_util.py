@@ -0,0 +1,43 @@
+# modules/sqlite_util.py
+# Thread-local SQLite connections in WAL mode, shared by the flowchart
+# history, the server-side sessions and the stream event log.
+import sqlite3
+import threading
+
+LOCAL = threading.local()
+INIT_LOCK = threading.Lock()
+INITIALIZED = set()
+
+
+def connection(db_path, schema, on_create=None):
+    """
+    One connection per thread and database file. The first connection to a
+    file in this process runs schema (CREATE ... IF NOT EXISTS statements),
+    then on_create(conn) if given, e.g. to import legacy data.
+    """
+    conns = getattr(LOCAL, "conns", None)
+    if conns is None:
+        conns = LOCAL.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        # WAL: readers never block the writer and vice versa
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[db_path] = conn
+        with INIT_LOCK:
+            if db_path not in INITIALIZED:
+                with conn:
+                    conn.executescript(schema)
+                if on_create is not None:
+                    on_create(conn)
+                INITIALIZED.add(db_path)
+    return conn
+
+
+def close_connections():
+    """Close this thread's connections (e.g. in a parent process before it forks workers)."""
+    for conn in getattr(LOCAL, "conns", {}).values():
+        conn.close()
+    LOCAL.conns = {}
@@ -0,0 +1,115 @@
+# modules/uploads.py
+# Multipart uploads written straight to their final, job-unique file while
+# werkzeug parses the body: the sha256 is computed on the fly, and each
+# tool's size limit and accepted types (app.config['UPLOAD_RULES'], keyed by
+# endpoint) are enforced before the rest of the body is read. Files are
+# removed when the request ends unless the view claimed them.
+import os
+import hashlib
+
+from flask import Request, current_app, request
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+from modules.workspace import unique_name
+
+
+class UnsupportedUpload(HTTPException):
+    code = 415
+    description = "Unsupported file format"
+
+
+class UploadFile:
+    """Write-through file for one uploaded part; hashes and counts what it writes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.claimed = False  # kept past the request (see claim_upload)
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.file = open(path, "w+b")
+
+    def write(self, data):
+        self.size += len(data)
+        self.digest.update(data)
+        return self.file.write(data)
+
+    @property
+    def sha256(self):
+        return self.digest.hexdigest()
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __getattr__(self, name):
+        # read/seek/close etc. for FileStorage
+        return getattr(self.file, name)
+
+
+class UploadRequest(Request):
+    """Request class (app.request_class) applying UPLOAD_RULES to its endpoint."""
+
+    def upload_rule(self):
+        return current_app.config.get("UPLOAD_RULES", {}).get(self.endpoint) if current_app else None
+
+    @property
+    def max_content_length(self):
+        # checked against Content-Length before anything is read, and while reading
+        rule = self.upload_rule()
+        return rule["max_bytes"] if rule else super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        rule = self.upload_rule()
+        name = secure_filename(filename or "")
+        if rule is None or not name:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        base, ext = os.path.splitext(name)
+        # the part headers arrive before its data: reject without reading the file
+        if ext.lower() not in rule["extensions"]:
+            raise UnsupportedUpload(f"Unsupported file format: {ext or name}")
+        upload = UploadFile(os.path.join(current_app.config["UPLOAD_FOLDER"], unique_name(base, ext)))
+        if not hasattr(self, "uploads"):
+            self.uploads = []
+        self.uploads.append(upload)
+        return upload
+
+
+def read_uploads():
+    """
+    Parse the current request's body. Returns (files, error): error is a
+    message for a rejected upload (too large, wrong type, broken body), in
+    which case anything already written for this request is removed.
+    """
+    try:
+        return request.files, None
+    except HTTPException as e:
+        for upload in getattr(request, "uploads", []):
+            upload.discard()
+        if isinstance(e, RequestEntityTooLarge):
+            limit = request.max_content_length
+            return None, f"File too large (limit {limit // (1024 * 1024)} MB)" if limit else "File too large"
+        return None, e.description
+
+
+def stored_upload(file):
+    """The UploadFile a FileStorage was written to, or None (no file chosen, no rule)."""
+    if file is None or not isinstance(file.stream, UploadFile):
+        return None
+    return file.stream
+
+
+def claim_upload(upload):
+    """Keep an upload's file after the request, e.g. for a background job (which then discards it)."""
+    upload.claimed = True
+    return upload
+
+
+def discard_unclaimed_uploads(exc=None):
+    """teardown_request handler: remove the request's upload files that no view claimed."""
+    for upload in getattr(request, "uploads", []):
+        if not upload.claimed:
+            upload.discard()
@@ -1,27 +1,29 @@
 import os
 import base64
-import boto3
 import json
 import time
 from PIL import Image
 from pdf2image import convert_from_path
 from botocore.exceptions import ClientError
 from docx import Document
+from modules.bedrock_stream import model_text, bedrock_client
+from modules.workspace import workspace
+from modules.metrics import timer, record_bedrock, bedrock_usage
 
 # === SETTINGS ===
 OUTPUT_FILE = "generated_result.txt"
-REGION = "ap-south-1"
 MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
 
 # === INITIALIZE BEDROCK CLIENT ===
 def get_bedrock_client():
-    session = boto3.session.Session()
-    return session.client("bedrock-runtime", region_name=REGION)
+    # shared per process instead of a new session and client for every page
+    return bedrock_client()
 
 # === UTILITIES ===
 def pdf_to_images(pdf_path):
     print("Converting PDF pages to images...")
-    return convert_from_path(pdf_path, dpi=200)
+    with timer("pdf_rasterize"):
+        return convert_from_path(pdf_path, dpi=200)
 
 def extract_text_from_image(image_path, max_retries=5):
     print(f"Extracting text from image: {image_path}")
@@ -60,13 +62,15 @@ def extract_text_from_image(image_path, max_retries=5):
     retries = 0
     while retries < max_retries:
         try:
-            response = client.invoke_model(
-                modelId=MODEL_ID,
-                contentType="application/json",
-                accept="application/json",
-                body=json.dumps(payload).encode("utf-8"),
-            )
-            result_json = json.loads(response["body"].read().decode("utf-8"))
+            with timer("ocr_page", model=MODEL_ID):
+                response = client.invoke_model(
+                    modelId=MODEL_ID,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=json.dumps(payload).encode("utf-8"),
+                )
+                result_json = json.loads(response["body"].read().decode("utf-8"))
+            record_bedrock("ocr_page", MODEL_ID, *bedrock_usage(result_json))
             final_text = "".join(
                 [c["text"] for c in result_json.get("content", []) if c["type"] == "text"]
             ).strip()
@@ -91,7 +95,7 @@ def extract_text_from_image(image_path, max_retries=5):
 
     raise Exception("Max retries reached. Image text extraction failed.")
 
-def extract_text_and_images_from_docx(docx_path):
+def extract_text_and_images_from_docx(docx_path, workdir="."):
     print(f"Extracting text and images from Word file: {docx_path}")
     doc = Document(docx_path)
     full_text = ""
@@ -106,7 +110,7 @@ def extract_text_and_images_from_docx(docx_path):
     for rel in doc.part._rels.values():
         if "image" in rel.reltype and getattr(rel, "target_part", None):
             img_bytes = rel.target_part.blob
-            img_path = f"docx_image_{img_count}.png"
+            img_path = os.path.join(workdir, f"docx_image_{img_count}.png")
             with open(img_path, "wb") as f:
                 f.write(img_bytes)
 
@@ -133,93 +137,70 @@ def extract_text_and_images_from_docx(docx_path):
 def chunk_text(text, max_length=12000):
     return [text[i:i+max_length] for i in range(0, len(text), max_length)]
 
-def generate_summary_from_text(text):
-    print("Generating intelligent summary...")
-    client = get_bedrock_client()
-
-    text_chunks = chunk_text(text)
-    combined_summary = ""
+def generate_text_in_chunks(text_chunks, build_prompt, label, stream=None):
+    """
+    Run one streamed model call per chunk and join the results. Text is
+    forwarded to stream as it arrives; a failed attempt's partial text is
+    taken back before the retry.
+    """
+    combined = ""
 
     for idx, chunk in enumerate(text_chunks, 1):
-        print(f"Processing summary chunk {idx}/{len(text_chunks)}...")
-        prompt = (
-            "You are an expert summarizer. Write a detailed summary of the text below "
-            "while preserving all important facts and context. No meta info.\n\nText:\n" + chunk
-        )
-
-        payload = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
-            "max_tokens": 8000,
-        }
+        print(f"Processing {label} chunk {idx}/{len(text_chunks)}...")
+        content = [{"type": "text", "text": build_prompt(chunk)}]
 
         retries = 0
         while retries < 5:
+            mark = stream.length if stream is not None else 0
             try:
-                response = client.invoke_model(
-                    modelId=MODEL_ID,
-                    contentType="application/json",
-                    accept="application/json",
-                    body=json.dumps(payload).encode("utf-8"),
-                )
-                result_json = json.loads(response["body"].read().decode("utf-8"))
-                summary_chunk = "".join(
-                    [c["text"] for c in result_json.get("content", []) if c["type"] == "text"]
-                )
-                combined_summary += summary_chunk.strip() + "\n\n"
+                result = model_text(content, stream=stream, model_id=MODEL_ID, max_tokens=8000,
+                                    stage=f"{label.lower()}_chunk")
+                combined += result.strip() + "\n\n"
+                if stream is not None:
+                    stream.append("\n\n")
                 break
             except Exception as e:
-                print(f"Retrying summary chunk {idx} due to error: {e}")
+                print(f"Retrying {label} chunk {idx} due to error: {e}")
+                if stream is not None:
+                    stream.truncate(mark)
                 time.sleep(2 ** retries)
                 retries += 1
 
-    return combined_summary.strip()
+    return combined.strip()
 
-def generate_mcqs_from_text(text):
-    print("Generating MCQs...")
-    client = get_bedrock_client()
-    text_chunks = chunk_text(text, max_length=10000)
-    all_mcqs = ""
+def generate_summary_from_text(text, stream=None):
+    print("Generating intelligent summary...")
+    return generate_text_in_chunks(
+        chunk_text(text),
+        lambda chunk: (
+            "You are an expert summarizer. Write a detailed summary of the text below "
+            "while preserving all important facts and context. No meta info.\n\nText:\n" + chunk
+        ),
+        "summary",
+        stream
+    )
 
-    for idx, chunk in enumerate(text_chunks, 1):
-        print(f"Processing MCQ chunk {idx}/{len(text_chunks)}...")
-        prompt = (
+def generate_mcqs_from_text(text, stream=None):
+    print("Generating MCQs...")
+    return generate_text_in_chunks(
+        chunk_text(text, max_length=10000),
+        lambda chunk: (
             "From the text below, generate 40 MCQs in this format:\n\n"
             "Q1. <Question>\nA. <Option A>\nB. <Option B>\nC. <Option C>\nD. <Option D>\n"
             "Correct Answer: <A/B/C/D>\nExplanation: <Short explanation>\n\n"
             "Rules:\n- Use only information from the text.\n- No duplicates.\n\n"
             "Text:\n" + chunk
-        )
-
-        payload = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
-            "max_tokens": 8000,
-        }
-
-        retries = 0
-        while retries < 5:
-            try:
-                response = client.invoke_model(
-                    modelId=MODEL_ID,
-                    contentType="application/json",
-                    accept="application/json",
-                    body=json.dumps(payload).encode("utf-8"),
-                )
-                result_json = json.loads(response["body"].read().decode("utf-8"))
-                mcqs = "".join(
-                    [c["text"] for c in result_json.get("content", []) if c["type"] == "text"]
-                )
-                all_mcqs += mcqs.strip() + "\n\n"
-                break
-            except Exception as e:
-                print(f"Retrying MCQ chunk {idx} due to error: {e}")
-                time.sleep(2 ** retries)
-                retries += 1
+        ),
+        "MCQ",
+        stream
+    )
 
-    return all_mcqs.strip()
+def process_document(input_path, operation="summary", pages_to_skip=None, stream=None):
+    # page/image scratch files go in a directory of their own, removed afterwards
+    with workspace("documents") as workdir:
+        return process_document_in(workdir, input_path, operation, pages_to_skip, stream)
 
-def process_document(input_path, operation="summary", pages_to_skip=None):
+def process_document_in(workdir, input_path, operation="summary", pages_to_skip=None, stream=None):
     if pages_to_skip is None:
         pages_to_skip = []
 
@@ -244,7 +225,10 @@ def process_document(input_path, operation="summary", pages_to_skip=None):
                 print(f"Skipping Page {page_num}")
                 continue
 
-            img_path = f"page_{page_num}.png"
+            if stream is not None:
+                stream.progress({"stage": "ocr", "page": page_num, "pages": len(images)})
+
+            img_path = os.path.join(workdir, f"page_{page_num}.png")
             image.save(img_path)
 
             try:
@@ -260,7 +244,8 @@ def process_document(input_path, operation="summary", pages_to_skip=None):
                 os.remove(img_path)
 
     elif ext == ".docx":
-        combined_text = extract_text_and_images_from_docx(input_path)
+        with timer("docx_extract"):
+            combined_text = extract_text_and_images_from_docx(input_path, workdir)
 
     # === SAFETY CHECK ===
     if not combined_text.strip():
@@ -272,9 +257,12 @@ def process_document(input_path, operation="summary", pages_to_skip=None):
         print("4. Images generated were empty or corrupted\n")
         raise Exception("No content extracted from document. Please verify your file or OCR setup.")
 
+    if stream is not None:
+        stream.progress({"stage": operation})
+
     if operation == "summary":
-        return generate_summary_from_text(combined_text)
+        return generate_summary_from_text(combined_text, stream)
     elif operation == "questions":
-        return generate_mcqs_from_text(combined_text)
+        return generate_mcqs_from_text(combined_text, stream)
     else:
         raise ValueError("Invalid operation. Choose 'summary' or 'questions'.")
@@ -0,0 +1,38 @@
+# modules/workspace.py
+# Per-job scratch directories and collision-free artifact names, so two
+# requests running the same tool never write to the same path.
+import os
+import shutil
+import secrets
+from contextlib import contextmanager
+from datetime import datetime
+
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", "workspaces")
+
+
+def job_id():
+    """Sortable, unique across threads and processes: timestamp + random suffix."""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}"
+
+
+def unique_name(prefix, ext=""):
+    """File name for a job artifact, e.g. unique_name("story_audio", ".mp3")."""
+    return f"{prefix}_{job_id()}{ext}"
+
+
+def new_workspace(tool):
+    """Create and return a fresh directory under WORKSPACE_ROOT/<tool>/."""
+    path = os.path.join(WORKSPACE_ROOT, tool, job_id())
+    os.makedirs(path)
+    return path
+
+
+@contextmanager
+def workspace(tool, keep=False):
+    """A fresh job directory for the with-block, removed afterwards unless keep=True."""
+    path = new_workspace(tool)
+    try:
+        yield path
+    finally:
+        if not keep:
+            shutil.rmtree(path, ignore_errors=True)
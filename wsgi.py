@@ -0,0 +1,36 @@
+# wsgi.py
+# Production entry point. gunicorn calls create_app() once in the master when
+# preload_app is on, so everything loaded here is shared by all workers.
+import os
+import importlib
+
+from app import app
+from modules import history_store, sqlite_util
+
+# WEB_PRELOAD=0: no preloading, each worker starts lean and imports a tool on first use
+PRELOAD = os.getenv("WEB_PRELOAD", "1") == "1"
+# imported lazily by the views; preloading puts them in memory shared by all workers
+TOOL_MODULES = ("modules.ganttchart", "modules.flowchart", "modules.utils", "modules.models", "modules.model2")
+
+
+def preload(flask_app):
+    """Load the read-only state every request needs before workers are forked."""
+    for name in TOOL_MODULES:
+        importlib.import_module(name)
+    # compiled templates stay in the Jinja cache of each forked worker
+    for name in flask_app.jinja_env.list_templates():
+        flask_app.jinja_env.get_template(name)
+    # matplotlib builds its font list lazily on the first chart otherwise
+    from matplotlib import font_manager
+    font_manager.findfont("DejaVu Sans")
+    # create the history schema and import the legacy index once, not per worker;
+    # SQLite connections must not cross a fork, so close them again
+    history_store.connection()
+    sqlite_util.close_connections()
+    print(f"Preloaded {len(flask_app.jinja_env.list_templates())} templates in process {os.getpid()}")
+
+
+def create_app():
+    if PRELOAD:
+        preload(app)
+    return app